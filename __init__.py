@@ -10,3 +10,9 @@
 
 from . import models
 from . import wizards
+
+
+def post_init_hook(env):
+    """ Reserve the amount of the draft outgoing payments existing before the installation. """
+    payments = env['account.payment'].search([('state', '=', 'draft'), ('payment_type', '=', 'outbound')])
+    env['sr.journal.balance.service']._sync_reservations(payments)
@@ -45,6 +45,8 @@
     'website':"https://www.sitaramsolutions.in",
     'depends': ['base', 'sale_management', 'purchase', 'stock', 'account'],
     'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron.xml',
         'views/inherited_invoice_payment.xml',
         'views/inherited_invoice.xml',
         'views/inherited_purchase_order.xml',
@@ -52,6 +54,7 @@
         'wizards/inherited_account_payment_register_view.xml',
     ],
     'demo': [],
+    'post_init_hook': 'post_init_hook',
     "external_dependencies": {},
     "license": "OPL-1",
     'installable': True,
@@ -14,3 +14,11 @@ from . import inherited_purchase_order
 from . import inherited_sales_order
 from . import inherited_res_currency
 from . import inherited_account_tax
+from . import liquidity_daily_balance
+from . import journal_balance_service
+from . import journal_balance_reservation
+from . import journal_balance_queue
+from . import exchange_difference_link
+from . import inherited_stock_valuation_layer
+from . import manual_rate_revaluation
+from . import sale_invoicing_run
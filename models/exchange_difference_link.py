@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+CONSOLIDATE_EXCHANGE_DIFFERENCE_PARAM = 'sr_manual_currency_exchange_rate.consolidate_exchange_difference'
+
+
+class ExchangeDifferenceLink(models.Model):
+    """ Trace of the journal items reconciled with a consolidated exchange difference entry.
+
+        When the consolidation is enabled through the ``CONSOLIDATE_EXCHANGE_DIFFERENCE_PARAM``
+        system parameter, the exchange differences of a reconciliation batch sharing a journal and
+        a date are posted in a single entry; each row links one of its lines to the journal item
+        whose partial reconciliation produced it. The partials of such an entry can only be
+        unreconciled all together, so that the entry is reversed once and as a whole.
+    """
+    _name = 'sr.exchange.difference.link'
+    _description = 'Exchange Difference Link'
+    _rec_name = 'exchange_move_id'
+    _log_access = False
+
+    exchange_move_id = fields.Many2one('account.move', string='Exchange Difference Entry', required=True,
+                                       readonly=True, index=True, ondelete='cascade')
+    exchange_line_id = fields.Many2one('account.move.line', string='Exchange Difference Item', required=True,
+                                       readonly=True, ondelete='cascade')
+    source_line_id = fields.Many2one('account.move.line', string='Reconciled Item', required=True,
+                                     readonly=True, index=True, ondelete='cascade')
+
+    @api.model
+    def _is_enabled(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(CONSOLIDATE_EXCHANGE_DIFFERENCE_PARAM))
+
+    @api.model
+    def _create_links(self, exchange_moves, exchange_diff_values_list):
+        """ Link the lines of the consolidated entries to the journal items they are reconciled with. """
+        vals_list = []
+        for exchange_move, exchange_diff_values in zip(exchange_moves, exchange_diff_values_list):
+            for source_line, sequence in exchange_diff_values['to_reconcile']:
+                vals_list.append({
+                    'exchange_move_id': exchange_move.id,
+                    'exchange_line_id': exchange_move.line_ids[sequence].id,
+                    'source_line_id': source_line.id,
+                })
+        # Technical trace written while reconciling, whatever the rights of the user.
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _check_unreconcile(self, partials):
+        """ Forbid unreconciling only some of the partials sharing a consolidated exchange difference entry.
+
+            Unreconciling reverses the exchange difference entry of the partials as a whole: it would
+            cancel the exchange differences of the partials that stay reconciled.
+        """
+        exchange_moves = partials.exchange_move_id
+        if not exchange_moves:
+            return
+        consolidated_moves = self.sudo().search([('exchange_move_id', 'in', exchange_moves.ids)]).exchange_move_id
+        if not consolidated_moves:
+            return
+        remaining_partials = self.env['account.partial.reconcile'].sudo().search([
+            ('exchange_move_id', 'in', consolidated_moves.ids),
+            ('id', 'not in', partials.ids),
+        ])
+        if remaining_partials:
+            raise UserError(_(
+                "The exchange differences of these items were posted in a consolidated entry (%s) shared "
+                "with other reconciliations. Unreconcile all the items of that entry together.",
+                ', '.join(remaining_partials.exchange_move_id.mapped('name')),
+            ))
@@ -10,6 +10,10 @@
 
 from odoo import models, fields, api, _
 
+from .tools import transaction_cache
+
+TAX_ADJUSTMENT_CACHE = 'sr_manual_currency_exchange_rate.tax_adjustments'
+
 
 class ProductProduct(models.Model):
     _inherit = "product.product"
@@ -54,13 +58,12 @@ class ProductProduct(models.Model):
 
         # Apply fiscal position.
         if product_taxes and fiscal_position:
-            product_taxes_after_fp = fiscal_position.map_tax(product_taxes)
-            flattened_taxes_after_fp = product_taxes_after_fp._origin.flatten_taxes_hierarchy()
-            flattened_taxes_before_fp = product_taxes._origin.flatten_taxes_hierarchy()
-            taxes_before_included = all(tax.price_include for tax in flattened_taxes_before_fp)
-
-            if set(product_taxes.ids) != set(product_taxes_after_fp.ids) and taxes_before_included:
-                taxes_res = flattened_taxes_before_fp.with_context(round=False, round_base=False).compute_all(
+            adjustment = self._get_fiscal_position_tax_adjustment(product_taxes, fiscal_position, is_refund_document)
+            if adjustment['factor'] is not None:
+                product_price_unit *= adjustment['factor']
+            elif adjustment['adjust']:
+                Tax = self.env['account.tax'].with_context(round=False, round_base=False)
+                taxes_res = Tax.browse(adjustment['taxes_before']).compute_all(
                     product_price_unit,
                     quantity=1.0,
                     currency=currency,
@@ -69,8 +72,8 @@ class ProductProduct(models.Model):
                 )
                 product_price_unit = taxes_res['total_excluded']
 
-                if any(tax.price_include for tax in flattened_taxes_after_fp):
-                    taxes_res = flattened_taxes_after_fp.with_context(round=False, round_base=False).compute_all(
+                if adjustment['price_include_after']:
+                    taxes_res = Tax.browse(adjustment['taxes_after']).compute_all(
                         product_price_unit,
                         quantity=1.0,
                         currency=currency,
@@ -79,8 +82,7 @@ class ProductProduct(models.Model):
                         handle_price_include=False,
                     )
                     for tax_res in taxes_res['taxes']:
-                        tax = self.env['account.tax'].browse(tax_res['id'])
-                        if tax.price_include:
+                        if tax_res['id'] in adjustment['price_include_after']:
                             product_price_unit += tax_res['amount']
 
         # Apply currency rate.
@@ -90,3 +92,62 @@ class ProductProduct(models.Model):
             # else:
             #     product_price_unit = product_currency._convert(product_price_unit, currency, company, document_date, round=False)
         return product_price_unit
+
+    @api.model
+    def _get_fiscal_position_tax_adjustment(self, product_taxes, fiscal_position, is_refund_document=False):
+        """ Return how a price including ``product_taxes`` is corrected when the fiscal position maps them.
+
+            The result is kept for the transaction per (taxes, price included flags, fiscal position, refund):
+            * adjust:              Whether the price has to be corrected at all.
+            * factor:              The correction as a plain multiplication, when all the taxes are simple
+                                   percentages; None otherwise and the price goes through ``compute_all``.
+            * taxes_before:        Ids of the flattened taxes before the mapping.
+            * taxes_after:         Ids of the flattened taxes after the mapping.
+            * price_include_after: Ids of the flattened taxes after the mapping that are price included.
+        """
+        product_taxes = product_taxes._origin
+        key = (
+            tuple(product_taxes.ids),
+            tuple(product_taxes.mapped('price_include')),
+            fiscal_position.id,
+            bool(is_refund_document),
+        )
+        cache = transaction_cache(self.env, TAX_ADJUSTMENT_CACHE)
+        if key in cache:
+            return cache[key]
+
+        product_taxes_after_fp = fiscal_position.map_tax(product_taxes)
+        flattened_taxes_before_fp = product_taxes.flatten_taxes_hierarchy()
+        flattened_taxes_after_fp = product_taxes_after_fp._origin.flatten_taxes_hierarchy()
+        taxes_before_included = all(tax.price_include for tax in flattened_taxes_before_fp)
+        price_include_after = flattened_taxes_after_fp.filtered('price_include')
+        adjust = set(product_taxes.ids) != set(product_taxes_after_fp.ids) and taxes_before_included
+
+        # The excluded taxes after the mapping take part in compute_all too (e.g. an excluded tax affecting
+        # the base of an included one), so the shortcut only holds when every tax is a simple percentage.
+        factor = None
+        if adjust and all(
+            self._is_simple_percent_tax(tax, is_refund_document)
+            for tax in flattened_taxes_before_fp | flattened_taxes_after_fp
+        ):
+            excluded = 1.0 + sum(flattened_taxes_before_fp.mapped('amount')) / 100.0
+            included = 1.0 + sum(price_include_after.mapped('amount')) / 100.0
+            factor = included / excluded
+
+        cache[key] = {
+            'adjust': adjust,
+            'factor': factor,
+            'taxes_before': flattened_taxes_before_fp.ids,
+            'taxes_after': flattened_taxes_after_fp.ids,
+            'price_include_after': set(price_include_after.ids),
+        }
+        return cache[key]
+
+    @api.model
+    def _is_simple_percent_tax(self, tax, is_refund_document=False):
+        """ Tell if ``compute_all`` boils down to ``base * amount / 100`` for ``tax``. """
+        if tax.amount_type != 'percent' or tax.include_base_amount:
+            return False
+        repartition_lines = tax.refund_repartition_line_ids if is_refund_document else tax.invoice_repartition_line_ids
+        factors = repartition_lines.filtered(lambda line: line.repartition_type == 'tax').mapped('factor')
+        return bool(factors) and abs(sum(factors) - 1.0) < 1e-9
@@ -8,8 +8,51 @@
 #
 ##############################################################################
 
+import logging
+import time
+from array import array
+from collections import defaultdict
 from contextlib import contextmanager
-from odoo import models, fields, api, _
+from odoo import models, fields, api, _, Command
+
+_logger = logging.getLogger(__name__)
+
+# Fields compared by AccountMoveLine._sync_invoice before and after the changes.
+SYNC_INVOICE_FIELDS = ('amount_currency', 'balance', 'currency_rate', 'price_subtotal', 'move_type')
+
+RECONCILIATION_RATES_CACHE = 'sr_manual_currency_exchange_rate.reconciliation_rates'
+
+
+class SyncInvoiceSnapshot:
+    """ Values of the ``SYNC_INVOICE_FIELDS`` of invoice lines, stored column by column and indexed
+        by line id, so that large invoices do not allocate one dict per line and per snapshot.
+    """
+    __slots__ = ('index',) + SYNC_INVOICE_FIELDS
+
+    def __init__(self, lines):
+        self.index = {line_id: position for position, line_id in enumerate(lines._ids)}
+        for fname in SYNC_INVOICE_FIELDS:
+            values = lines.mapped(fname)
+            setattr(self, fname, values if fname == 'move_type' else array('d', values))
+
+    def __contains__(self, line_id):
+        return line_id in self.index
+
+    def get(self, line_id):
+        """ Return the raw values of a line as a tuple, or None if the line is not in the snapshot. """
+        position = self.index.get(line_id)
+        if position is None:
+            return None
+        return tuple(getattr(self, fname)[position] for fname in SYNC_INVOICE_FIELDS)
+
+    def rounded(self, line, fname):
+        """ Return the value of a field of a line, rounded like the sync compares it. """
+        value = getattr(self, fname)[self.index[line.id]]
+        if fname in ('amount_currency', 'price_subtotal'):
+            return line.currency_id.round(value)
+        if fname == 'balance':
+            return line.company_id.currency_id.round(value)
+        return value
 
 
 class AccountMove(models.Model):
@@ -29,41 +72,103 @@ class AccountMove(models.Model):
         else:
             self.active_manual_currency_rate = False
 
+    def write(self, vals):
+        if 'state' not in vals:
+            return super(AccountMove, self).write(vals)
+        # Keep the running balances of the liquidity accounts in sync with the posted moves.
+        daily_balance = self.env['sr.liquidity.daily.balance']
+        posted = vals['state'] == 'posted'
+        unposted_moves = self.filtered(lambda move: move.state == 'posted' and not posted)
+        newly_posted_moves = self.filtered(lambda move: move.state != 'posted' and posted)
+        daily_balance._apply_moves(unposted_moves, -1)
+        # The moves are applied as a whole here, their lines must not be applied again while they change state.
+        res = super(AccountMove, self.with_context(skip_liquidity_balance_lines=True)).write(vals)
+        daily_balance._apply_moves(newly_posted_moves, 1)
+        service = self.env['sr.journal.balance.service']
+        service._invalidate_cache()
+        # Posted payments are part of the balance now, the draft ones earmark their amount again.
+        service._sync_reservations(self.payment_id)
+        queue = self.env['sr.journal.balance.queue']
+        if (unposted_moves or newly_posted_moves) and queue._is_enabled():
+            queue._enqueue(self.env['account.journal'].search([
+                ('type', 'in', ('bank', 'cash')),
+                ('default_account_id', 'in', (unposted_moves | newly_posted_moves).line_ids.account_id.ids),
+            ]))
+        return res
+
+
+# Fields of the journal items changing their contribution to the running balances of the liquidity accounts.
+LIQUIDITY_BALANCE_FIELDS = ('account_id', 'date', 'balance', 'amount_currency', 'debit', 'credit')
+
 
 class AccountMoveLine(models.Model):
     _inherit = 'account.move.line'
 
+    def _get_liquidity_balance_lines(self):
+        """ Return the posted lines of ``self`` whose changes must be reported to the running balances. """
+        if self.env.context.get('skip_liquidity_balance_lines'):
+            return self.browse()
+        return self.filtered(lambda line: line.move_id.state == 'posted')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(AccountMoveLine, self).create(vals_list)
+        self.env['sr.liquidity.daily.balance']._apply_lines(lines._get_liquidity_balance_lines(), 1)
+        return lines
+
+    def write(self, vals):
+        if not any(fname in vals for fname in LIQUIDITY_BALANCE_FIELDS):
+            return super(AccountMoveLine, self).write(vals)
+        # Replace the old contribution of the posted lines by the new one.
+        daily_balance = self.env['sr.liquidity.daily.balance']
+        posted_lines = self._get_liquidity_balance_lines()
+        daily_balance._apply_lines(posted_lines, -1)
+        res = super(AccountMoveLine, self).write(vals)
+        daily_balance._apply_lines(posted_lines.exists(), 1)
+        return res
+
+    def unlink(self):
+        self.env['sr.liquidity.daily.balance']._apply_lines(self._get_liquidity_balance_lines(), -1)
+        return super(AccountMoveLine, self).unlink()
+
     @api.depends('product_id', 'product_uom_id')
     def _compute_price_unit(self):
+        # The company, currency, date, fiscal position and manual rate all come from the move: the lines
+        # of a move sharing a product and a unit of measure get the same price, computed once per group.
+        groups = defaultdict(list)
         for line in self:
             if not line.product_id or line.display_type in ('line_section', 'line_note'):
                 continue
-            if line.move_id.is_sale_document(include_receipts=True):
+            groups[(line.move_id, line.product_id, line.product_uom_id)].append(line.id)
+
+        for (move, product, product_uom), line_ids in groups.items():
+            if move.is_sale_document(include_receipts=True):
                 document_type = 'sale'
-            elif line.move_id.is_purchase_document(include_receipts=True):
+            elif move.is_purchase_document(include_receipts=True):
                 document_type = 'purchase'
             else:
                 document_type = 'other'
 
-            if line.move_id.apply_manual_currency_exchange:
-                line.price_unit = line.product_id._get_tax_included_unit_price_cus(
-                    line.move_id.company_id,
-                    line.move_id.currency_id,
-                    line.move_id.date,
+            if move.apply_manual_currency_exchange:
+                price_unit = product._get_tax_included_unit_price_cus(
+                    move.company_id,
+                    move.currency_id,
+                    move.date,
                     document_type,
-                    fiscal_position=line.move_id.fiscal_position_id,
-                    product_uom=line.product_uom_id,
-                    order_id=line.move_id,
+                    fiscal_position=move.fiscal_position_id,
+                    product_uom=product_uom,
+                    order_id=move,
                 )
             else:
-                line.price_unit = line.product_id._get_tax_included_unit_price(
-                    line.move_id.company_id,
-                    line.move_id.currency_id,
-                    line.move_id.date,
+                price_unit = product._get_tax_included_unit_price(
+                    move.company_id,
+                    move.currency_id,
+                    move.date,
                     document_type,
-                    fiscal_position=line.move_id.fiscal_position_id,
-                    product_uom=line.product_uom_id,
+                    fiscal_position=move.fiscal_position_id,
+                    product_uom=product_uom,
                 )
+            self.browse(line_ids).price_unit = price_unit
 
     @contextmanager
     def _sync_invoice(self, container):
@@ -72,40 +177,37 @@ class AccountMoveLine(models.Model):
             return  # avoid infinite recursion
 
         def existing():
-            return {
-                line: {
-                    'amount_currency': line.currency_id.round(line.amount_currency),
-                    'balance': line.company_id.currency_id.round(line.balance),
-                    'currency_rate': line.currency_rate,
-                    'price_subtotal': line.currency_id.round(line.price_subtotal),
-                    'move_type': line.move_id.move_type,
-                } for line in container['records'].with_context(
-                    skip_invoice_line_sync=True,
-                ).filtered(lambda l: l.move_id.is_invoice(True))
-            }
+            return SyncInvoiceSnapshot(container['records'].with_context(
+                skip_invoice_line_sync=True,
+            ).filtered(lambda l: l.move_id.is_invoice(True)))
 
         def changed(fname):
-            return line not in before or before[line][fname] != after[line][fname]
+            return line.id not in before or before.rounded(line, fname) != after.rounded(line, fname)
 
         before = existing()
         yield
         after = existing()
-        for line in after:
+        # Only the new lines and the lines whose tracked values were touched need to be synchronized.
+        lines = container['records'].with_context(skip_invoice_line_sync=True).browse([
+            line_id for line_id in after.index
+            if before.get(line_id) != after.get(line_id)
+        ])
+        for line in lines:
             if (
                 line.display_type == 'product'
-                and (not changed('amount_currency') or line not in before)
+                and (not changed('amount_currency') or line.id not in before)
             ):
                 amount_currency = line.move_id.direction_sign * line.currency_id.round(line.price_subtotal)
-                if line.amount_currency != amount_currency or line not in before:
+                if line.amount_currency != amount_currency or line.id not in before:
                     line.amount_currency = amount_currency
                 if line.currency_id == line.company_id.currency_id:
                     line.balance = amount_currency
 
-        after = existing()
-        for line in after:
+        after = SyncInvoiceSnapshot(lines)
+        for line in lines:
             if (
                 (changed('amount_currency') or changed('currency_rate') or changed('move_type'))
-                and (not changed('balance') or (line not in before and not line.balance))
+                and (not changed('balance') or (line.id not in before and not line.balance))
             ):
                 balance = line.company_id.currency_id.round(line.amount_currency / line.currency_rate)
                 if line.move_id.apply_manual_currency_exchange and line.move_id.manual_currency_exchange_rate:
@@ -118,6 +220,161 @@ class AccountMoveLine(models.Model):
         self.env.add_to_compute(self._fields['credit'], container['records'])
 
 
+    @api.model
+    def _reconcile_plan_with_sync(self, plan_list, all_amls):
+        rates = self._get_reconciliation_rates()
+        if rates and set(all_amls.ids) <= rates['dates'].keys():
+            # Already prefetched by an enclosing scope, e.g. a bulk reconciliation.
+            return super(AccountMoveLine, self)._reconcile_plan_with_sync(plan_list, all_amls)
+        with self._reconciliation_rates_scope(all_amls):
+            return super(AccountMoveLine, self)._reconcile_plan_with_sync(plan_list, all_amls)
+
+    @api.model
+    def _create_exchange_difference_moves(self, exchange_diff_values_list):
+        link = self.env['sr.exchange.difference.link']
+        if len(exchange_diff_values_list) < 2 or not link._is_enabled():
+            return super(AccountMoveLine, self)._create_exchange_difference_moves(exchange_diff_values_list)
+        consolidated_values_list, positions = self._consolidate_exchange_difference_values(exchange_diff_values_list)
+        exchange_moves = super(AccountMoveLine, self)._create_exchange_difference_moves(consolidated_values_list)
+        link._create_links(exchange_moves, consolidated_values_list)
+        # The caller expects one move per exchange difference, in the same order.
+        return exchange_moves.browse([exchange_moves[position].id for position in positions])
+
+    @api.model
+    def _consolidate_exchange_difference_values(self, exchange_diff_values_list):
+        """ Merge the exchange difference moves of a batch sharing a journal and a date.
+
+            The lines to reconcile are kept one by one, the other ones (exchange gain/loss) are summed
+            per (account, currency).
+
+        :return: The consolidated list and, for each item of ``exchange_diff_values_list``, the index
+                 of the consolidated move it went into.
+        """
+        consolidated_values_list = []
+        aggregated_lines_list = []
+        positions = []
+        index = {}
+        for exchange_diff_values in exchange_diff_values_list:
+            move_values = exchange_diff_values['move_values']
+            key = (move_values.get('journal_id'), move_values.get('date'))
+            if key not in index:
+                index[key] = len(consolidated_values_list)
+                consolidated_values_list.append({
+                    'move_values': dict(move_values, line_ids=[]),
+                    'to_reconcile': [],
+                })
+                aggregated_lines_list.append({})
+            positions.append(index[key])
+            consolidated = consolidated_values_list[index[key]]
+            aggregated_lines = aggregated_lines_list[index[key]]
+            line_commands = consolidated['move_values']['line_ids']
+
+            source_lines = {sequence: source_line for source_line, sequence in exchange_diff_values['to_reconcile']}
+            for sequence, command in enumerate(move_values['line_ids']):
+                line_vals = dict(command[2])
+                if sequence in source_lines:
+                    consolidated['to_reconcile'].append((source_lines[sequence], len(line_commands)))
+                    line_vals['sequence'] = len(line_commands)
+                    line_commands.append((command[0], command[1], line_vals))
+                    continue
+                line_key = (line_vals.get('account_id'), line_vals.get('currency_id'))
+                balance = line_vals.pop('balance', line_vals.get('debit', 0.0) - line_vals.get('credit', 0.0))
+                if line_key not in aggregated_lines:
+                    aggregated_lines[line_key] = dict(line_vals, balance=0.0, amount_currency=0.0)
+                aggregated = aggregated_lines[line_key]
+                aggregated['balance'] += balance
+                aggregated['amount_currency'] += line_vals.get('amount_currency', 0.0)
+                if aggregated.get('partner_id') != line_vals.get('partner_id'):
+                    aggregated['partner_id'] = False
+
+        # The aggregated lines come after the lines to reconcile, whose sequences are left untouched.
+        for consolidated, aggregated_lines in zip(consolidated_values_list, aggregated_lines_list):
+            line_commands = consolidated['move_values']['line_ids']
+            for line_vals in aggregated_lines.values():
+                balance = line_vals.pop('balance')
+                if not balance and not line_vals['amount_currency']:
+                    continue
+                line_vals.update({
+                    'debit': balance if balance > 0.0 else 0.0,
+                    'credit': -balance if balance < 0.0 else 0.0,
+                    'sequence': len(line_commands),
+                })
+                line_commands.append(Command.create(line_vals))
+        return consolidated_values_list, positions
+
+    def _reconcile_manual_rate_bulk(self):
+        """ Reconcile a large set of journal items at once, e.g. manual-rate invoices and their payments.
+
+            The open items are grouped per (account, partner) and all the groups go through a single
+            reconciliation plan: the rates of the whole set are prefetched once, and the partials and
+            exchange differences of every group are created together by ``_reconcile_plan``.
+        """
+        amls = self.filtered(lambda aml: not aml.reconciled and aml.account_id.reconcile and aml.parent_state == 'posted')
+        groups = defaultdict(list)
+        for aml in amls:
+            groups[(aml.account_id, aml.partner_id)].append(aml.id)
+        plan = [self.browse(aml_ids) for aml_ids in groups.values() if len(aml_ids) > 1]
+        if not plan:
+            return
+        start = time.time()
+        with self._reconciliation_rates_scope(amls):
+            self._reconcile_plan(plan)
+        duration = time.time() - start
+        _logger.info(
+            "Bulk reconciliation of %s journal items in %s groups done in %.2fs (%.0f items/s)",
+            len(amls), len(plan), duration, len(amls) / duration if duration else 0.0,
+        )
+
+    @api.model
+    @contextmanager
+    def _reconciliation_rates_scope(self, amls):
+        """ Prefetch the rates needed to reconcile ``amls`` for the duration of the block. """
+        stack = self.env.cr.cache.setdefault(RECONCILIATION_RATES_CACHE, [])
+        stack.append(self._prefetch_reconciliation_rates(amls))
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    @api.model
+    def _get_reconciliation_rates(self):
+        """ Return the rates prefetched by the innermost ``_reconciliation_rates_scope``, if any. """
+        stack = self.env.cr.cache.get(RECONCILIATION_RATES_CACHE)
+        return stack[-1] if stack else None
+
+    @api.model
+    def _prefetch_reconciliation_rates(self, amls):
+        """ Collect in one pass the rates used by ``_prepare_move_line_residual_amounts`` for ``amls``:
+            * dates:          aml id -> date of the aml.
+            * exchange_dates: aml id -> invoice date for invoices, date of the aml otherwise.
+            * payments:       ids of the amls of payments and bank statement lines.
+            * manual_rates:   move id -> manual rate, for the moves applying one.
+            * odoo_rates:     (company id, currency id, date) -> rate from the company currency.
+        """
+        rates = {'dates': {}, 'exchange_dates': {}, 'payments': set(), 'manual_rates': {}, 'odoo_rates': {}}
+        for move in amls.move_id:
+            if move.apply_manual_currency_exchange:
+                rates['manual_rates'][move.id] = move.manual_currency_exchange_rate
+        for aml in amls:
+            move = aml.move_id
+            rates['dates'][aml.id] = aml.date
+            rates['exchange_dates'][aml.id] = move.invoice_date if move.is_invoice(include_receipts=True) else aml.date
+            if move.payment_id or move.statement_line_id:
+                rates['payments'].add(aml.id)
+
+        # The Odoo rates are used for the lines in company currency, towards the currencies of the batch.
+        foreign_currencies = amls.currency_id - amls.company_currency_id
+        for aml in amls:
+            if aml.currency_id != aml.company_currency_id or aml.move_id.id in rates['manual_rates']:
+                continue
+            for date in {rates['dates'][aml.id], rates['exchange_dates'][aml.id]}:
+                for currency in foreign_currencies:
+                    key = (aml.company_id.id, currency.id, date)
+                    if key not in rates['odoo_rates']:
+                        rates['odoo_rates'][key] = currency._get_conversion_rate(
+                            aml.company_currency_id, currency, aml.company_id, date)
+        return rates
+
     @api.model
     def _prepare_move_line_residual_amounts(self, aml_values, counterpart_currency, shadowed_aml_values=None, other_aml_values=None):
         """ Prepare the available residual amounts for each currency.
@@ -135,7 +392,22 @@ class AccountMoveLine(models.Model):
         def is_payment(aml):
             return aml.move_id.payment_id or aml.move_id.statement_line_id
 
+        def get_prefetched_odoo_rate(aml, other_aml, currency):
+            if aml.move_id.id in rates['manual_rates']:
+                return rates['manual_rates'][aml.move_id.id]
+            exchange_rate_date = rates['exchange_dates'][aml.id]
+            if other_aml and aml.id not in rates['payments'] and other_aml.id in rates['payments']:
+                exchange_rate_date = rates['dates'][other_aml.id]
+            key = (aml.company_id.id, currency.id, exchange_rate_date)
+            if key not in rates['odoo_rates']:
+                rates['odoo_rates'][key] = currency._get_conversion_rate(
+                    aml.company_currency_id, currency, aml.company_id, exchange_rate_date)
+            return rates['odoo_rates'][key]
+
         def get_odoo_rate(aml, other_aml, currency):
+            # The prefetched dates are only valid when no aml value is shadowed.
+            if rates and aml.id in rates['dates'] and (not other_aml or other_aml.id in rates['dates']):
+                return get_prefetched_odoo_rate(aml, other_aml, currency)
             if aml.move_id.is_invoice(include_receipts=True):
                 exchange_rate_date = aml.move_id.invoice_date
             else:
@@ -153,6 +425,7 @@ class AccountMoveLine(models.Model):
             if not aml.company_currency_id.is_zero(balance) and not currency.is_zero(amount_currency):
                 return abs(amount_currency / balance)
 
+        rates = not shadowed_aml_values and self._get_reconciliation_rates()
         aml = aml_values['aml']
         other_aml = (other_aml_values or {}).get('aml')
         remaining_amount_curr = aml_values['amount_residual_currency']
@@ -196,3 +469,11 @@ class AccountMoveLine(models.Model):
                 'rate': get_accounting_rate(aml, currency),
             }
         return available_residual_per_currency
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = 'account.partial.reconcile'
+
+    def unlink(self):
+        self.env['sr.exchange.difference.link']._check_unreconcile(self)
+        return super(AccountPartialReconcile, self).unlink()
@@ -33,6 +33,30 @@ class AccountPayments(models.Model):
         ('warning', 'Warning')
     ], string="Payment Button State", compute='_compute_payment_button_state', default='normal')
 
+    journal_available_balance = fields.Monetary(
+        string="Saldo Disponible del Diario",
+        compute='_compute_journal_available_balance',
+        help="Saldo actual del diario menos los montos reservados por otros pagos de salida en borrador."
+    )
+    # Stored copies of the journal balance fields, refreshed by a cron when the stored mode is enabled
+    stored_journal_current_balance = fields.Monetary(
+        string="Saldo del Diario (Almacenado)", readonly=True, copy=False)
+    stored_can_confirm_payment = fields.Boolean(
+        string="Can Confirm Payment (Stored)", readonly=True, copy=False)
+    stored_payment_button_state = fields.Selection([
+        ('normal', 'Normal'),
+        ('disabled', 'Disabled'),
+        ('warning', 'Warning')
+    ], string="Payment Button State (Stored)", readonly=True, copy=False)
+    journal_balance_refreshed_at = fields.Datetime(
+        string="Journal Balance Refreshed At", readonly=True, copy=False,
+        help="When the stored journal balance fields were last recomputed. They are stale if the journal "
+             "received postings since then.")
+    reserved_journal_id = fields.Many2one('account.journal', string="Reserved Journal", readonly=True, copy=False)
+    reserved_amount = fields.Float(
+        string="Reserved Amount", digits=0, readonly=True, copy=False,
+        help="Amount earmarked on the journal while the outgoing payment is in draft.")
+
     # rhodetech custom fields
     apply_manual_currency_exchange = fields.Boolean(
         string='Apply Manual Currency Exchange')
@@ -48,99 +72,35 @@ class AccountPayments(models.Model):
         Calcula el saldo del diario al momento de la fecha del pago,
         obteniendo el saldo directamente desde la cuenta contable asociada.
         """
-        # Get all unique accounts and dates to optimize the query
-        accounts_to_compute = {}
+        balances = self.env['sr.journal.balance.service']._get_balances(
+            (payment.journal_id, payment.date) for payment in self
+        )
         for payment in self:
-            if (payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and 
-                payment.journal_id.default_account_id and 
-                payment.date):
-                account = payment.journal_id.default_account_id
-                if account.id not in accounts_to_compute:
-                    accounts_to_compute[account.id] = []
-                accounts_to_compute[account.id].append(payment.date)
-        
-        # Calculate balances for each account up to each date
-        balances = {}
-        for account_id, dates in accounts_to_compute.items():
-            for date in set(dates):  # Use set to avoid duplicate queries for same date
-                domain = [
-                    ('account_id', '=', account_id),
-                    ('date', '<=', date),
-                    ('parent_state', '=', 'posted')
-                ]
-                
-                # Use _read_group for efficient aggregation like Odoo core
-                result = self.env['account.move.line']._read_group(
-                    domain=domain,
-                    groupby=['account_id'],
-                    aggregates=['balance:sum'],
-                )
-                
-                if result:
-                    # _read_group returns a list of tuples, where the first element is the group key
-                    # and subsequent elements are the aggregated values
-                    balance = result[0][1]  # First result, second element (balance sum)
-                    balances[(account_id, date)] = balance
-                else:
-                    balances[(account_id, date)] = 0.0
-        
-        # Assign balances to payments
+            payment.journal_current_balance = balances.get((payment.journal_id.id, payment.date), 0.0)
+
+    @api.depends('journal_id', 'reserved_amount', 'journal_current_balance')
+    def _compute_journal_available_balance(self):
+        reserved_amounts = self.env['sr.journal.balance.service']._get_reserved_amounts(self.journal_id)
         for payment in self:
-            payment.journal_current_balance = 0.0
-            
-            if (payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and 
-                payment.journal_id.default_account_id and 
-                payment.date):
-                
-                account = payment.journal_id.default_account_id
-                balance = balances.get((account.id, payment.date), 0.0)
-                
-                # For foreign currency journals, we need to convert the balance
-                if (payment.journal_id.currency_id and 
-                    payment.journal_id.currency_id != payment.company_id.currency_id):
-                    # The balance field is in company currency, so we need to get the amount_currency
-                    domain = [
-                        ('account_id', '=', account.id),
-                        ('date', '<=', payment.date),
-                        ('parent_state', '=', 'posted')
-                    ]
-                    
-                    # Use _read_group for amount_currency aggregation
-                    result = self.env['account.move.line']._read_group(
-                        domain=domain,
-                        groupby=['account_id'],
-                        aggregates=['amount_currency:sum'],
-                    )
-                    
-                    if result:
-                        # _read_group returns a list of tuples, where the first element is the group key
-                        # and subsequent elements are the aggregated values
-                        payment.journal_current_balance = result[0][1]  # First result, second element (amount_currency sum)
-                    else:
-                        payment.journal_current_balance = 0.0
-                else:
-                    payment.journal_current_balance = balance
+            reserved = reserved_amounts.get(payment.journal_id._origin.id, 0.0)
+            if payment.reserved_journal_id == payment.journal_id:
+                reserved -= payment.reserved_amount
+            payment.journal_available_balance = payment.journal_current_balance - reserved
 
-    @api.depends('journal_id', 'amount', 'journal_current_balance')
+    @api.depends('journal_id', 'amount', 'currency_id', 'date', 'manual_currency_exchange_rate',
+                 'journal_current_balance', 'journal_available_balance')
     def _compute_can_confirm_payment(self):
         """
-        Determina si el pago puede ser confirmado basándose en el saldo del diario
+        Determina si el pago puede ser confirmado basándose en el saldo disponible del diario
         """
+        service = self.env['sr.journal.balance.service']
         for payment in self:
-            payment.can_confirm_payment = True
-            
-            # Solo validamos para pagos de salida (outbound) y diarios de banco/efectivo
-            if (payment.payment_type == 'outbound' and 
-                payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and
-                payment.amount and payment.journal_current_balance and 
-                payment.state == 'draft'):
-                
-                # Si el monto del pago es mayor que el saldo disponible, no se puede confirmar
-                if payment.amount > payment.journal_current_balance:
-                    payment.can_confirm_payment = False
+            payment.can_confirm_payment = not (
+                payment.state == 'draft'
+                and service._exceeds_balance(
+                    payment.payment_type, payment.journal_id, service._get_journal_amount(payment),
+                    payment.journal_current_balance, payment.journal_available_balance)
+            )
 
     @api.depends('can_confirm_payment', 'payment_type', 'journal_id', 'amount')
     def _compute_payment_button_state(self):
@@ -160,25 +120,62 @@ class AccountPayments(models.Model):
         Valida que el diario tenga saldo suficiente para realizar el pago
         """
         self.ensure_one()
-        
-        # Solo validamos para pagos de salida (outbound) y diarios de banco/efectivo
-        if (self.payment_type == 'outbound' and 
-            self.journal_id and 
-            self.journal_id.type in ('bank', 'cash') and
-            self.amount and self.journal_current_balance):
-            
-            # Si el monto del pago es mayor que el saldo disponible, lanzamos error
-            if self.amount > self.journal_current_balance:
-                raise ValidationError(_(
-                    "No se puede confirmar el pago. El monto del pago (%.2f) "
-                    "excede el saldo disponible en el diario (%.2f)."
-                ) % (self.amount, self.journal_current_balance))
+        service = self.env['sr.journal.balance.service']
+        service._validate_balance(
+            self.payment_type, self.journal_id, service._get_journal_amount(self),
+            self.journal_current_balance, self.journal_available_balance)
+
+    def _refresh_stored_journal_balance(self):
+        """
+        Copy the current journal balance fields of the payments into their stored counterparts
+        """
+        if not self:
+            return
+        self.env.cr.execute("""
+            UPDATE account_payment payment
+               SET stored_journal_current_balance = refresh.balance,
+                   stored_can_confirm_payment = refresh.can_confirm,
+                   stored_payment_button_state = refresh.button_state,
+                   journal_balance_refreshed_at = %s
+              FROM unnest(%s::int[], %s::numeric[], %s::bool[], %s::varchar[])
+                   AS refresh(payment_id, balance, can_confirm, button_state)
+             WHERE payment.id = refresh.payment_id
+        """, [
+            fields.Datetime.now(),
+            self.ids,
+            [payment.journal_current_balance for payment in self],
+            [payment.can_confirm_payment for payment in self],
+            [payment.payment_button_state for payment in self],
+        ])
+        self.invalidate_recordset([
+            'stored_journal_current_balance',
+            'stored_can_confirm_payment',
+            'stored_payment_button_state',
+            'journal_balance_refreshed_at',
+        ])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        payments = super(AccountPayments, self).create(vals_list)
+        self.env['sr.journal.balance.service']._sync_reservations(payments)
+        self.env['sr.journal.balance.queue']._enqueue(payments.journal_id)
+        return payments
+
+    def write(self, vals):
+        res = super(AccountPayments, self).write(vals)
+        if any(fname in vals for fname in ('amount', 'journal_id', 'payment_type', 'date')):
+            self.env['sr.journal.balance.service']._sync_reservations(self)
+            self.env['sr.journal.balance.queue']._enqueue(self.journal_id)
+        return res
+
+    def unlink(self):
+        self.env['sr.journal.balance.service']._sync_reservations(self, release=True)
+        return super(AccountPayments, self).unlink()
 
     def action_post(self):
-        # Validate journal balance before posting payment
-        for payment in self:
-            payment._validate_journal_balance()
-        
+        # Validate journal balance before posting payments, in one pass for the whole batch
+        self.env['sr.journal.balance.service']._validate_payments(self)
+
         return super(AccountPayments, self).action_post()
 
     def _get_confirm_button_attrs(self):
@@ -245,25 +242,13 @@ class AccountPayments(models.Model):
                 liquidity_balance = liquidity_amount_currency * self.manual_currency_exchange_rate
                 write_off_balance = write_off_amount_currency * self.manual_currency_exchange_rate
             else:
-                write_off_balance = self.currency_id._convert(
-                    write_off_amount_currency,
-                    self.company_id.currency_id,
-                    self.company_id,
-                    self.date,
-                )
-                liquidity_balance = self.currency_id._convert(
-                    liquidity_amount_currency,
+                write_off_balance, liquidity_balance = self.currency_id._convert_many(
+                    [write_off_amount_currency, liquidity_amount_currency],
                     self.company_id.currency_id,
                     self.company_id,
                     self.date,
                 )
         else:
-            write_off_balance = self.currency_id._convert(
-                write_off_amount_currency,
-                self.company_id.currency_id,
-                self.company_id,
-                self.date,
-            )
             # Old Code
             # liquidity_balance = self.currency_id._convert(
             #     liquidity_amount_currency,
@@ -274,11 +259,17 @@ class AccountPayments(models.Model):
 
             # New code
             if not write_off_line_vals and force_balance is not None:
+                write_off_balance = self.currency_id._convert(
+                    write_off_amount_currency,
+                    self.company_id.currency_id,
+                    self.company_id,
+                    self.date,
+                )
                 sign = 1 if liquidity_amount_currency > 0 else -1
                 liquidity_balance = sign * abs(force_balance)
             else:
-                liquidity_balance = self.currency_id._convert(
-                    liquidity_amount_currency,
+                write_off_balance, liquidity_balance = self.currency_id._convert_many(
+                    [write_off_amount_currency, liquidity_amount_currency],
                     self.company_id.currency_id,
                     self.company_id,
                     self.date,
@@ -8,10 +8,16 @@
 #
 ##############################################################################
 
+from collections import defaultdict
+from contextlib import nullcontext
+
 from odoo import models, fields, api, _
 from odoo.tools.float_utils import float_compare, float_is_zero, float_round
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT, format_amount, format_date, formatLang, get_lang, groupby
 
+KEEP_PURCHASE_LINE_NAMES_PARAM = 'sr_manual_currency_exchange_rate.keep_purchase_line_names'
+MANUAL_UNIT_COSTS_CACHE = 'sr_manual_currency_exchange_rate.manual_unit_costs'
+
 
 class PurchaseOrder(models.Model):
     _inherit = 'purchase.order'
@@ -22,13 +28,17 @@ class PurchaseOrder(models.Model):
 
     @api.depends('date_order', 'currency_id', 'company_id', 'company_id.currency_id')
     def _compute_currency_rate(self):
+        # Resolve each distinct (company currency, currency, company, date) once for the whole batch.
+        orders_per_key = defaultdict(list)
         for order in self:
             if order.apply_manual_currency_exchange:
                 order.currency_rate = order.manual_currency_exchange_rate
-            else:
-                order.currency_rate = self.env['res.currency']._get_conversion_rate(order.company_id.currency_id,
-                                                                                    order.currency_id, order.company_id,
-                                                                                    order.date_order)
+                continue
+            key = (order.company_id.currency_id, order.currency_id, order.company_id, fields.Date.to_date(order.date_order))
+            orders_per_key[key].append(order.id)
+        for (company_currency, currency, company, date), order_ids in orders_per_key.items():
+            self.browse(order_ids).currency_rate = self.env['res.currency']._get_conversion_rate(
+                company_currency, currency, company, date)
 
     @api.onchange('company_id','currency_id')
     def onchange_currency_id(self):
@@ -40,6 +50,78 @@ class PurchaseOrder(models.Model):
         else:
             self.active_manual_currency_rate = False
 
+    def _get_tax_base_lines(self):
+        """ Return a mapping order -> tax base line dicts of its product lines, built for all the orders at once. """
+        order_lines = self.order_line.filtered(lambda line: not line.display_type)
+        base_lines = defaultdict(list)
+        for line, base_line in zip(order_lines, order_lines._convert_to_tax_base_line_dicts()):
+            base_lines[line.order_id].append(base_line)
+        return base_lines
+
+    @api.depends('order_line.price_total')
+    def _amount_all(self):
+        base_lines = self._get_tax_base_lines()
+        for order in self:
+            order_lines = order.order_line.filtered(lambda x: not x.display_type)
+            if order.company_id.tax_calculation_rounding_method == 'round_globally':
+                tax_results = self.env['account.tax']._compute_taxes(base_lines[order])
+                totals = tax_results['totals']
+                amount_untaxed = totals.get(order.currency_id, {}).get('amount_untaxed', 0.0)
+                amount_tax = totals.get(order.currency_id, {}).get('amount_tax', 0.0)
+            else:
+                amount_untaxed = sum(order_lines.mapped('price_subtotal'))
+                amount_tax = sum(order_lines.mapped('price_tax'))
+            order.amount_untaxed = amount_untaxed
+            order.amount_tax = amount_tax
+            order.amount_total = order.amount_untaxed + order.amount_tax
+
+    @api.depends_context('lang')
+    @api.depends('order_line.taxes_id', 'order_line.price_subtotal', 'amount_total', 'amount_untaxed')
+    def _compute_tax_totals(self):
+        base_lines = self._get_tax_base_lines()
+        for order in self:
+            order.tax_totals = self.env['account.tax']._prepare_tax_totals(
+                base_lines[order],
+                order.currency_id or order.company_id.currency_id,
+            )
+
+    def write(self, vals):
+        if 'manual_currency_exchange_rate' not in vals and 'apply_manual_currency_exchange' not in vals:
+            return super(PurchaseOrder, self).write(vals)
+        # The receipts already valued with the previous manual rate are revalued with the new one.
+        old_rates = self._get_valuation_manual_rates()
+        res = super(PurchaseOrder, self).write(vals)
+        revaluation = self.env['sr.manual.rate.revaluation']
+        revaluation._apply_revaluations(
+            revaluation._compute_revaluations(old_rates, self._get_valuation_manual_rates()))
+        return res
+
+    def _get_valuation_manual_rates(self):
+        """ Return a mapping order id -> manual rate valuing the receipts, for the confirmed manual-rate orders. """
+        return {
+            order.id: order.manual_currency_exchange_rate
+            for order in self
+            if order.state in ('purchase', 'done')
+            and order.apply_manual_currency_exchange
+            and order.manual_currency_exchange_rate > 0
+        }
+
+    def _preview_manual_rate_revaluation(self, manual_rate):
+        """ Dry run of a change of the manual rate of the orders: return the revaluations it would post,
+            as computed by ``sr.manual.rate.revaluation._compute_revaluations``, without changing anything.
+        """
+        old_rates = self._get_valuation_manual_rates()
+        return self.env['sr.manual.rate.revaluation']._compute_revaluations(
+            old_rates, dict.fromkeys(old_rates, manual_rate))
+
+    def _manual_rate_scope(self):
+        """ Scope in which the currency conversions use the manual rate of the order, if any. """
+        self.ensure_one()
+        if not self.active_manual_currency_rate:
+            return nullcontext()
+        return self.env['res.currency']._rate_override(
+            self.apply_manual_currency_exchange and self.manual_currency_exchange_rate)
+
     def _prepare_invoice(self):
         res = super(PurchaseOrder, self)._prepare_invoice()
         res.update({
@@ -60,12 +142,6 @@ class PurchaseOrderLine(models.Model):
         :return: A python dictionary.
         """
         self.ensure_one()
-        if self.order_id.active_manual_currency_rate:
-            self = self.with_context(
-                manual_rate=self.order_id.manual_currency_exchange_rate,
-                active_manutal_currency=self.order_id.apply_manual_currency_exchange,
-            )
-
         return self.env['account.tax']._convert_to_tax_base_line_dict(
             self,
             partner=self.order_id.partner_id,
@@ -88,27 +164,156 @@ class PurchaseOrderLine(models.Model):
         #     price_subtotal=self.price_subtotal,
         # )
 
+    def _convert_to_tax_base_line_dicts(self):
+        """ Batch variant of ``_convert_to_tax_base_line_dict``, used by the amount and tax totals computes.
+
+            Each line still goes through ``_convert_to_tax_base_line_dict``, so its overrides apply, and the
+            lines of all the orders are converted together, sharing their prefetching.
+
+        :return: A list of python dictionaries, in the order of the records.
+        """
+        return [line._convert_to_tax_base_line_dict() for line in self]
+
+    @api.depends('product_qty', 'price_unit', 'taxes_id', 'discount')
+    def _compute_amount(self):
+        # The taxes are still computed line by line, so each line keeps its own rounding.
+        for line, base_line in zip(self, self._convert_to_tax_base_line_dicts()):
+            tax_results = self.env['account.tax'].with_company(line.company_id)._compute_taxes([base_line])
+            totals = next(iter(tax_results['totals'].values()))
+            amount_untaxed = totals['amount_untaxed']
+            amount_tax = totals['amount_tax']
+
+            line.update({
+                'price_subtotal': amount_untaxed,
+                'price_tax': amount_tax,
+                'price_total': amount_untaxed + amount_tax,
+            })
+
+    @api.model
+    def _get_seller_index(self, products):
+        """ Index the vendors of ``products`` for ``_select_indexed_seller``, reading them with one query.
+
+        :return: A mapping product -> list of its product.supplierinfo, in the order of ``_prepare_sellers``,
+                 or None when the seller selection is customized and has to go through ``_select_seller``.
+        """
+        Product = type(self.env['product.product'])
+        if any(
+            hasattr(Product, method) and not getattr(Product, method).__module__.startswith('odoo.addons.product.')
+            for method in ('_select_seller', '_get_filtered_sellers', '_prepare_sellers')
+        ):
+            return None
+        sellers_per_template = defaultdict(list)
+        sellers = self.env['product.supplierinfo'].search([('product_tmpl_id', 'in', products.product_tmpl_id.ids)])
+        for seller in sellers.filtered(lambda s: s.partner_id.active).sorted(
+                lambda s: (s.sequence, -s.min_qty, s.price, s.id)):
+            sellers_per_template[seller.product_tmpl_id].append(seller)
+        return {
+            product: [
+                seller for seller in sellers_per_template[product.product_tmpl_id]
+                if not seller.product_id or seller.product_id == product
+            ]
+            for product in products
+        }
+
+    def _select_indexed_seller(self, sellers, partner, quantity, date, uom, precision):
+        """ Same selection as ``product.product._select_seller``, among the indexed ``sellers`` of the product. """
+        company = self.env.company
+        res = []
+        for seller in sellers:
+            if seller.company_id and seller.company_id != company:
+                continue
+            quantity_uom_seller = quantity
+            if quantity_uom_seller and uom and uom != seller.product_uom:
+                quantity_uom_seller = uom._compute_quantity(quantity_uom_seller, seller.product_uom)
+            if seller.date_start and seller.date_start > date:
+                continue
+            if seller.date_end and seller.date_end < date:
+                continue
+            if partner and seller.partner_id not in (partner, partner.parent_id):
+                continue
+            if float_compare(quantity_uom_seller, seller.min_qty, precision_digits=precision) == -1:
+                continue
+            if not res or res[0].partner_id == seller.partner_id:
+                res.append(seller)
+        if not res:
+            return self.env['product.supplierinfo']
+        return min(res, key=lambda seller: seller.price)
+
     @api.onchange('product_id')
     def onchange_product_id(self):
-        if self.order_id.active_manual_currency_rate:
-            self = self.with_context(
-                manual_rate=self.order_id.manual_currency_exchange_rate,
-                active_manutal_currency=self.order_id.apply_manual_currency_exchange,
-            )
-        return super(PurchaseOrderLine, self).onchange_product_id()
+        with self.order_id._manual_rate_scope():
+            return super(PurchaseOrderLine, self).onchange_product_id()
 
     @api.depends('product_qty', 'product_uom', 'company_id')
     def _compute_price_unit_and_date_planned_and_name(self):
+        price_precision = self.env['decimal.precision'].precision_get('Product Price')
+
+        # Per-batch indexes: the sellers of all the products are read at once and the seller resolution is
+        # a lookup in that index; the descriptions and the languages are computed once per distinct key.
+        seller_partners = {product: set(product.seller_ids.partner_id.ids) for product in self.product_id}
+        seller_index = self._get_seller_index(self.product_id)
+        qty_precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        selected_sellers = {}
+        lang_codes = {}
+        descriptions = {}
+        default_names = {}
+        # Optionally leave the names of the existing lines alone as long as their product is unchanged.
+        keep_names = self.env['ir.config_parameter'].sudo().get_param(KEEP_PURCHASE_LINE_NAMES_PARAM)
+
+        def select_seller(line):
+            date = line.order_id.date_order and line.order_id.date_order.date() or fields.Date.context_today(line)
+            if seller_index is not None:
+                return line._select_indexed_seller(
+                    seller_index[line.product_id], line.partner_id, line.product_qty, date, line.product_uom, qty_precision)
+            key = (line.product_id, line.partner_id, line.product_qty, date, line.product_uom, line.order_id)
+            if key not in selected_sellers:
+                selected_sellers[key] = line.product_id._select_seller(
+                    partner_id=line.partner_id,
+                    quantity=line.product_qty,
+                    date=date,
+                    uom_id=line.product_uom,
+                    params=line._get_select_sellers_params())
+            return selected_sellers[key]
+
+        def get_description_key(line):
+            # The description is a line method: modules like purchase_product_matrix append the
+            # attribute values of the line that do not create variants.
+            no_variant_values = line['product_no_variant_attribute_value_ids'] \
+                if 'product_no_variant_attribute_value_ids' in line._fields else ()
+            return line.product_id, tuple(no_variant_values and no_variant_values.ids)
+
+        def get_description(line, product_ctx):
+            key = (get_description_key(line), tuple(sorted(product_ctx.items())))
+            if key not in descriptions:
+                descriptions[key] = line._get_product_purchase_description(line.product_id.with_context(product_ctx))
+            return descriptions[key]
+
+        def get_default_names(line, lang_code):
+            key = (get_description_key(line), lang_code)
+            if key not in default_names:
+                names = {get_description(line, {'seller_id': None, 'partner_id': None, 'lang': lang_code})}
+                for vendor in line.product_id._prepare_sellers({}):
+                    names.add(get_description(line, {'seller_id': vendor.id, 'lang': lang_code}))
+                default_names[key] = names
+            return default_names[key]
+
+        def get_lang_code(partner):
+            if partner.lang not in lang_codes:
+                lang_codes[partner.lang] = get_lang(self.env, partner.lang).code
+            return lang_codes[partner.lang]
+
+        def set_price_unit(line, price_unit, seller):
+            price_unit = float_round(price_unit, precision_digits=max(line.currency_id.decimal_places, price_precision))
+            if seller:
+                price_unit = seller.product_uom._compute_price(price_unit, line.product_uom)
+            line.price_unit = price_unit
+
+        # (line, currency, price_unit, seller) of the prices still to convert into the line currency.
+        to_convert = []
         for line in self:
             if not line.product_id or line.invoice_lines or not line.company_id:
                 continue
-            params = line._get_select_sellers_params()
-            seller = line.product_id._select_seller(
-                partner_id=line.partner_id,
-                quantity=line.product_qty,
-                date=line.order_id.date_order and line.order_id.date_order.date() or fields.Date.context_today(line),
-                uom_id=line.product_uom,
-                params=params)
+            seller = select_seller(line)
 
             if seller or not line.date_planned:
                 line.date_planned = line._get_date_planned(seller).strftime(DEFAULT_SERVER_DATETIME_FORMAT)
@@ -116,8 +321,7 @@ class PurchaseOrderLine(models.Model):
             # If not seller, use the standard price. It needs a proper currency conversion.
             if not seller:
                 line.discount = 0
-                unavailable_seller = line.product_id.seller_ids.filtered(
-                    lambda s: s.partner_id == line.order_id.partner_id)
+                unavailable_seller = line.order_id.partner_id.id in seller_partners[line.product_id]
                 if not unavailable_seller and line.price_unit and line.product_uom == line._origin.product_uom:
                     # Avoid to modify the price unit if there is no price list for this partner and
                     # the line has already one to avoid to override unit price set manually.
@@ -131,18 +335,9 @@ class PurchaseOrderLine(models.Model):
                 )
                 if line.order_id.apply_manual_currency_exchange:
                     price_unit = line.product_id.standard_price * line.order_id.manual_currency_exchange_rate
+                    set_price_unit(line, price_unit, False)
                 else:
-                    price_unit = line.product_id.cost_currency_id._convert(
-                        price_unit,
-                        line.currency_id,
-                        line.company_id,
-                        line.date_order or fields.Date.context_today(line),
-                        False
-                    )
-                line.price_unit = float_round(price_unit, precision_digits=max(line.currency_id.decimal_places,
-                                                                               self.env[
-                                                                                   'decimal.precision'].precision_get(
-                                                                                   'Product Price')))
+                    to_convert.append((line, line.product_id.cost_currency_id, price_unit, False))
 
             elif seller:
                 price_unit = line.env['account.tax']._fix_tax_included_price_company(seller.price,
@@ -151,26 +346,26 @@ class PurchaseOrderLine(models.Model):
                                                                                      line.company_id) if seller else 0.0
                 if line.order_id.apply_manual_currency_exchange:
                     price_unit = price_unit * line.order_id.manual_currency_exchange_rate
+                    set_price_unit(line, price_unit, seller)
                 else:
-                    price_unit = seller.currency_id._convert(price_unit, line.currency_id, line.company_id,
-                                                             line.date_order or fields.Date.context_today(line), False)
-                price_unit = float_round(price_unit, precision_digits=max(line.currency_id.decimal_places,
-                                                                          self.env['decimal.precision'].precision_get(
-                                                                              'Product Price')))
-                line.price_unit = seller.product_uom._compute_price(price_unit, line.product_uom)
+                    to_convert.append((line, seller.currency_id, price_unit, seller))
                 line.discount = seller.discount or 0.0
 
             # record product names to avoid resetting custom descriptions
-            default_names = []
-            vendors = line.product_id._prepare_sellers({})
-            product_ctx = {'seller_id': None, 'partner_id': None, 'lang': get_lang(line.env, line.partner_id.lang).code}
-            default_names.append(line._get_product_purchase_description(line.product_id.with_context(product_ctx)))
-            for vendor in vendors:
-                product_ctx = {'seller_id': vendor.id, 'lang': get_lang(line.env, line.partner_id.lang).code}
-                default_names.append(line._get_product_purchase_description(line.product_id.with_context(product_ctx)))
-            if not line.name or line.name in default_names:
-                product_ctx = {'seller_id': seller.id, 'lang': get_lang(line.env, line.partner_id.lang).code}
-                line.name = line._get_product_purchase_description(line.product_id.with_context(product_ctx))
+            if keep_names and line.name and line.product_id == line._origin.product_id:
+                continue
+            lang_code = get_lang_code(line.partner_id)
+            if not line.name or line.name in get_default_names(line, lang_code):
+                line.name = get_description(line, {'seller_id': seller.id, 'lang': lang_code})
+
+        # Convert the prices in bulk, once per source currency, so each distinct rate is resolved once.
+        for currency, items in groupby(to_convert, key=lambda item: item[1]):
+            price_units = currency._convert_many([
+                (price_unit, line.currency_id, line.company_id, line.date_order or fields.Date.context_today(line))
+                for line, dummy, price_unit, dummy in items
+            ], round=False)
+            for (line, dummy, dummy, seller), price_unit in zip(items, price_units):
+                set_price_unit(line, price_unit, seller)
 
     # @api.depends('product_qty', 'product_uom', 'company_id')
     # def _compute_price_unit_and_date_planned_and_name(self):
@@ -251,8 +446,34 @@ class PurchaseOrderLine(models.Model):
 class StockMove(models.Model):
     _inherit = 'stock.move'
 
+    def _get_in_svl_vals(self, forced_quantity):
+        # Resolve the manual-rate unit costs of all the incoming moves at once.
+        unit_costs = self._get_manual_rate_unit_costs()
+        stack = self.env.cr.cache.setdefault(MANUAL_UNIT_COSTS_CACHE, [])
+        stack.append(unit_costs)
+        try:
+            svl_vals_list = super(StockMove, self)._get_in_svl_vals(forced_quantity)
+        finally:
+            stack.pop()
+        # Keep the rate the layers are valued at, for a later revaluation if it changes.
+        rates = {move.id: move.picking_id.purchase_id.manual_currency_exchange_rate for move in self if move.id in unit_costs}
+        for svl_vals in svl_vals_list:
+            if svl_vals.get('stock_move_id') in rates:
+                svl_vals['manual_currency_exchange_rate'] = rates[svl_vals['stock_move_id']]
+        return svl_vals_list
+
+    def _get_manual_rate_unit_costs(self):
+        """ Return a mapping move id -> unit cost in company currency, for the moves of manual-rate purchases.
+
+            Their price unit was already converted with the manual rate of the order when the move was created.
+        """
+        manual_orders = self.picking_id.purchase_id.filtered('apply_manual_currency_exchange')
+        return {move.id: move.price_unit for move in self if move.picking_id.purchase_id in manual_orders}
+
     def _get_price_unit(self):
-        price = super(StockMove, self)._get_price_unit()
+        stack = self.env.cr.cache.get(MANUAL_UNIT_COSTS_CACHE)
+        if stack and self.id in stack[-1]:
+            return stack[-1][self.id]
         if self.picking_id.purchase_id and self.picking_id.purchase_id.apply_manual_currency_exchange:
-            price = self.price_unit
-        return price
+            return self.price_unit
+        return super(StockMove, self)._get_price_unit()
@@ -8,7 +8,16 @@
 #
 ##############################################################################
 
-from odoo import models, fields, api, _
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+
+from odoo import models, fields, api, tools, _
+
+from .tools import transaction_cache, clear_transaction_cache
+
+CONVERSION_RATE_CACHE = 'sr_manual_currency_exchange_rate.conversion_rates'
+RATE_OVERRIDE_CACHE = 'sr_manual_currency_exchange_rate.rate_overrides'
 
 
 class ResCurrency(models.Model):
@@ -30,12 +39,119 @@ class ResCurrency(models.Model):
         company = company or self.env.company
         date = date or fields.Date.context_today(self)
 
+        override = self._get_rate_override()
         if self._context.get('active_manutal_currency'):
             res = self._context.get('manual_rate')
+        elif override is not None:
+            res = override
         else:
-            res = from_currency.with_company(company).with_context(to_currency=to_currency.id, date=str(date)).inverse_rate
+            cache = self._get_conversion_rate_cache()
+            key = (from_currency.id, to_currency.id, company.id, fields.Date.to_date(date))
+            res = cache['rates'].get(key)
+            if res is None:
+                cache['misses'] += 1
+                date = key[3]
+                res = cache['rates'][key] = (
+                    self._get_indexed_rate(to_currency, company, date)
+                    / self._get_indexed_rate(from_currency, company, date)
+                )
+            else:
+                cache['hits'] += 1
         return res
 
+    @api.model
+    def _get_conversion_rate_cache(self):
+        """ Memo of the conversion rates already resolved during the current transaction,
+            keyed by (from currency, to currency, company, date).
+        """
+        return transaction_cache(self.env, CONVERSION_RATE_CACHE, lambda: {'rates': {}, 'hits': 0, 'misses': 0})
+
+    @api.model
+    def _get_conversion_rate_cache_stats(self):
+        """ Return the hit/miss counters of the conversion rate memo. """
+        cache = self._get_conversion_rate_cache()
+        return {'hits': cache['hits'], 'misses': cache['misses'], 'size': len(cache['rates'])}
+
+    @api.model
+    def _clear_conversion_rate_cache(self):
+        clear_transaction_cache(self.env, CONVERSION_RATE_CACHE)
+
+    @api.model
+    @contextmanager
+    def _rate_override(self, rate, kind='conversion'):
+        """ Apply a manual rate for the duration of the ``with`` block, without cloning the environment.
+
+            The scope is bound to the transaction, so every environment sharing the cursor sees it.
+            Nested scopes shadow the outer ones; a falsy ``rate`` disables the override in the block.
+
+           :param rate: The manual rate to apply.
+           :param kind: ``'conversion'`` to override the rate returned by ``_get_conversion_rate``
+                        (the former ``manual_rate`` context key), ``'convert'`` to override the rate
+                        applied by ``_convert`` (the former ``cus_manual_rate``/``diff_manual_rate``).
+        """
+        stack = transaction_cache(self.env, RATE_OVERRIDE_CACHE, list)
+        entry = (kind, rate or None)
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            if stack and stack[-1] is entry:
+                stack.pop()
+
+    @api.model
+    def _get_rate_override(self, kind='conversion'):
+        """ Return the rate of the innermost ``_rate_override`` scope of the given kind, if any. """
+        for entry_kind, rate in reversed(self.env.cr.cache.get(RATE_OVERRIDE_CACHE, ())):
+            if entry_kind == kind:
+                return rate
+        return None
+
+    @api.model
+    @tools.ormcache('currency_id', 'company_id')
+    def _get_rate_index(self, currency_id, company_id):
+        """ Load the rate history of a currency for a (root) company once per worker.
+
+        :return: A tuple ``(company_dates, company_rates, shared_dates, shared_rates)`` of arrays
+                 sorted by date, the dates being stored as ordinals. ``company_*`` hold the rates
+                 of the company itself and ``shared_*`` the rates without company.
+        """
+        self.env['res.currency.rate'].flush_model(['rate', 'currency_id', 'company_id', 'name'])
+        self.env.cr.execute("""
+            SELECT company_id, name, rate
+              FROM res_currency_rate
+             WHERE currency_id = %s
+               AND (company_id IS NULL OR company_id = %s)
+          ORDER BY name
+        """, [currency_id, company_id])
+        company_dates, company_rates = array('l'), array('d')
+        shared_dates, shared_rates = array('l'), array('d')
+        for rate_company_id, name, rate in self.env.cr.fetchall():
+            if rate_company_id:
+                company_dates.append(name.toordinal())
+                company_rates.append(rate)
+            else:
+                shared_dates.append(name.toordinal())
+                shared_rates.append(rate)
+        return company_dates, company_rates, shared_dates, shared_rates
+
+    @api.model
+    def _get_indexed_rate(self, currency, company, date):
+        """ Return the rate of ``currency`` at or before ``date``, with the same precedence as
+            ``_get_rates``: the company rates first, then the shared ones, then the rate of the
+            very first date and finally 1.
+        """
+        company_dates, company_rates, shared_dates, shared_rates = self._get_rate_index(
+            currency.id, company.root_id.id)
+        ordinal = date.toordinal()
+        for dates, rates in ((company_dates, company_rates), (shared_dates, shared_rates)):
+            index = bisect_right(dates, ordinal)
+            if index:
+                return rates[index - 1]
+        for rates in (company_rates, shared_rates):
+            if rates:
+                return rates[0]
+        return 1.0
+
     # def _convert(self, from_amount, to_currency, company, date, round=True):
     def _convert(self, from_amount, to_currency, company=None, date=None, round=True):
         """Returns the converted amount of ``from_amount``` from the currency
@@ -51,10 +167,13 @@ class ResCurrency(models.Model):
         assert to_currency, "convert amount to unknown currency"
         # apply conversion rate
         if from_amount:
+            override = self._get_rate_override('convert')
             if self._context.get('cus_active_manutal_currency'):
                 to_amount = from_amount * self._context.get('cus_manual_rate')
             elif self._context.get('diff_active_manutal_currency'):
                 to_amount = from_amount * self._context.get('diff_manual_rate')
+            elif override is not None:
+                to_amount = from_amount * override
             else:
                 to_amount = from_amount * self._get_conversion_rate(self, to_currency, company, date)
         else:
@@ -62,3 +181,77 @@ class ResCurrency(models.Model):
 
         # apply rounding
         return to_currency.round(to_amount) if round else to_amount
+
+    def _convert_many(self, from_amounts, to_currency=None, company=None, date=None, round=True):
+        """Batched version of ``_convert``: returns the list of the converted amounts of
+           ``from_amounts`` from the currency ``self``, in the same order.
+
+           ``from_amounts`` is either a sequence of ``(amount, to_currency, company, date)`` tuples,
+           or a sequence of amounts. In the latter case ``to_currency``, ``company`` and ``date``
+           are either a single value shared by all the amounts or sequences parallel to
+           ``from_amounts``.
+           Each distinct conversion rate is resolved only once.
+
+           :param round: Round the results or not
+        """
+        assert self, "convert amount from unknown currency"
+        if to_currency is None and company is None and date is None:
+            values = list(from_amounts)
+        else:
+            amounts = list(from_amounts)
+
+            def column(value):
+                return value if isinstance(value, (list, tuple)) else [value] * len(amounts)
+
+            values = list(zip(amounts, column(to_currency), column(company), column(date)))
+
+        if self._context.get('cus_active_manutal_currency'):
+            forced_rate = self._context.get('cus_manual_rate')
+        elif self._context.get('diff_active_manutal_currency'):
+            forced_rate = self._context.get('diff_manual_rate')
+        else:
+            forced_rate = self._get_rate_override('convert')
+
+        rates = {}
+        to_amounts = []
+        for from_amount, to_curr, comp, dt in values:
+            to_curr = to_curr or self
+            if not from_amount:
+                to_amounts.append(0.0)
+                continue
+            if forced_rate is not None:
+                rate = forced_rate
+            else:
+                key = (to_curr.id, comp and comp.id, dt)
+                if key not in rates:
+                    rates[key] = self._get_conversion_rate(self, to_curr, comp, dt)
+                rate = rates[key]
+            to_amount = from_amount * rate
+            to_amounts.append(to_curr.round(to_amount) if round else to_amount)
+        return to_amounts
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = 'res.currency.rate'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ResCurrencyRate, self).create(vals_list)
+        self._invalidate_rate_caches()
+        return res
+
+    def write(self, vals):
+        res = super(ResCurrencyRate, self).write(vals)
+        self._invalidate_rate_caches()
+        return res
+
+    def unlink(self):
+        res = super(ResCurrencyRate, self).unlink()
+        self._invalidate_rate_caches()
+        return res
+
+    def _invalidate_rate_caches(self):
+        # The rate index is an ormcache: clearing the registry cache also signals
+        # the other workers to drop their copy.
+        self.env.registry.clear_cache()
+        self.env['res.currency']._clear_conversion_rate_cache()
@@ -8,7 +8,10 @@
 #
 ##############################################################################
 
+from contextlib import nullcontext
+
 from odoo import models, fields, api, _
+from odoo.tools import groupby
 
 
 class SalesOrder(models.Model):
@@ -28,6 +31,22 @@ class SalesOrder(models.Model):
             })
         return result
 
+    def _manual_rate_scope(self):
+        """ Scope in which the currency conversions use the manual rate of the order, if any. """
+        self.ensure_one()
+        if not self.active_manual_currency_rate:
+            return nullcontext()
+        return self.env['res.currency']._rate_override(
+            self.apply_manual_currency_exchange and self.manual_currency_exchange_rate)
+
+    def _create_invoices_by_chunks(self, chunk_size=500):
+        """ Invoice the orders by chunks through a resumable invoicing run, processed by the cron. """
+        return self.env['sr.sale.invoicing.run']._start(self, chunk_size=chunk_size)
+
+    def _apply_manual_rate_prices(self):
+        """ Reprice the lines of the orders in batch, e.g. after a server-side import. """
+        self.order_line._apply_manual_rate_prices()
+
     @api.onchange('company_currency_id', 'currency_id')
     def onchange_currency_id(self):
         if self.company_currency_id or self.currency_id:
@@ -44,22 +63,71 @@ class SaleOrderLine(models.Model):
 
     @api.onchange('product_uom', 'product_uom_qty', 'product_id')
     def product_uom_change(self):
-        if self.order_id.active_manual_currency_rate:
-            self = self.with_context(
-                    manual_rate=self.order_id.manual_currency_exchange_rate,
-                    active_manutal_currency=self.order_id.apply_manual_currency_exchange,
-                )
         if not self.product_uom or not self.product_id:
             self.price_unit = 0.0
             return
-        if self.order_id.pricelist_id and self.order_id.partner_id:
-            product = self.product_id.with_context(
-                lang=self.order_id.partner_id.lang,
-                partner=self.order_id.partner_id,
-                quantity=self.product_uom_qty,
-                date=self.order_id.date_order,
-                pricelist=self.order_id.pricelist_id.id,
-                uom=self.product_uom.id,
-                fiscal_position=self.env.context.get('fiscal_position')
-            )
-            self.price_unit = self.env['account.tax']._fix_tax_included_price_company(self._get_display_price(), product.taxes_id, self.tax_id, self.company_id)
+        self._apply_manual_rate_prices()
+
+    def _apply_manual_rate_prices(self):
+        """ Set the unit price of the lines from the pricelist of their order and its manual rate. """
+        for line, price_unit in self._get_manual_rate_prices().items():
+            line.price_unit = price_unit
+
+    def _get_manual_rate_prices(self):
+        """ Price the lines in batch: the lines of an order sharing a quantity and a unit of measure are
+        evaluated with a single pricelist pass, under the manual-rate scope of the order.
+
+        :return: A mapping line -> unit price, for the lines of orders having a pricelist and a customer.
+        """
+        prices = {}
+        # Only the lines priced by the standard pricelist computation are batched: as soon as another
+        # module customizes it (event tickets, rental, subscriptions...), every line is delegated.
+        SaleOrderLine = type(self)
+        standard_pricing = all(
+            not hasattr(SaleOrderLine, method) or getattr(SaleOrderLine, method).__module__.startswith('odoo.addons.sale.')
+            for method in ('_get_display_price', '_get_pricelist_price', '_get_product_price_context')
+        )
+        lines = self.filtered(lambda l: l.product_id and l.product_uom
+                              and l.order_id.pricelist_id and l.order_id.partner_id)
+        for (order, quantity, uom), group in groupby(lines, key=lambda l: (l.order_id, l.product_uom_qty, l.product_uom)):
+            # Like the standard pricing, a line without quantity is priced for one unit.
+            quantity = quantity or 1.0
+            pricelist = order.pricelist_id
+            with order._manual_rate_scope():
+                # The pricelist price is the displayed one unless the discount is shown apart, or the
+                # price depends on the attributes of the line: these go through _get_display_price.
+                batch_lines = [
+                    line for line in group
+                    if standard_pricing
+                    and pricelist.discount_policy == 'with_discount'
+                    and not line.display_type
+                    and not line.is_downpayment
+                    and not line.product_no_variant_attribute_value_ids
+                ]
+                batch_line_ids = {line.id for line in batch_lines}
+                rule_prices = {}
+                if batch_lines:
+                    products = self.env['product.product'].browse([line.product_id.id for line in batch_lines])
+                    rule_prices = pricelist._compute_price_rule(
+                        products.with_context(
+                            lang=order.partner_id.lang,
+                            partner=order.partner_id,
+                            quantity=quantity,
+                            date=order.date_order,
+                            pricelist=pricelist.id,
+                            uom=uom.id,
+                            fiscal_position=self.env.context.get('fiscal_position'),
+                        ),
+                        quantity,
+                        currency=order.currency_id,
+                        uom=uom,
+                        date=order.date_order,
+                    )
+                for line in group:
+                    if line.id in batch_line_ids:
+                        price_unit = rule_prices[line.product_id.id][0]
+                    else:
+                        price_unit = line._get_display_price()
+                    prices[line] = self.env['account.tax']._fix_tax_included_price_company(
+                        price_unit, line.product_id.taxes_id, line.tax_id, line.company_id)
+        return prices
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import models, fields, api, _
+
+
+class StockValuationLayer(models.Model):
+    _inherit = 'stock.valuation.layer'
+
+    manual_currency_exchange_rate = fields.Float(string='Receipt Manual Currency Exchange Rate', digits=(16, 6),
+                                                 readonly=True,
+                                                 help="Manual rate of the purchase order used to value the receipt.")
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import models, fields, api, _
+
+STORED_BALANCE_PARAM = 'sr_manual_currency_exchange_rate.stored_journal_balance'
+
+
+class JournalBalanceQueue(models.Model):
+    """ Journals whose draft payments need their stored journal balance fields to be recomputed.
+
+        Only used when the stored mode is enabled through the ``STORED_BALANCE_PARAM`` system
+        parameter; the queue is emptied by a cron.
+    """
+    _name = 'sr.journal.balance.queue'
+    _description = 'Journal Balance Recompute Queue'
+    _rec_name = 'journal_id'
+    _log_access = False
+
+    journal_id = fields.Many2one('account.journal', string='Journal', required=True, readonly=True, ondelete='cascade')
+
+    _sql_constraints = [
+        ('journal_uniq', 'unique (journal_id)', 'A journal can only be queued once.'),
+    ]
+
+    @api.model
+    def _is_enabled(self):
+        return bool(self.env['ir.config_parameter'].sudo().get_param(STORED_BALANCE_PARAM))
+
+    @api.model
+    def _enqueue(self, journals):
+        """ Queue the bank/cash journals among ``journals`` for a recompute, if the stored mode is enabled. """
+        journal_ids = journals._origin.filtered(lambda j: j.type in ('bank', 'cash')).ids
+        if not journal_ids or not self._is_enabled():
+            return
+        self.env.cr.execute("""
+            INSERT INTO sr_journal_balance_queue (journal_id)
+                 SELECT journal_id
+                   FROM unnest(%s::int[]) AS journal_id
+            ON CONFLICT (journal_id) DO NOTHING
+        """, [journal_ids])
+
+    @api.model
+    def _cron_process_queue(self):
+        """ Recompute the stored journal balance fields of the draft payments of the queued journals. """
+        self.env.cr.execute("DELETE FROM sr_journal_balance_queue RETURNING journal_id")
+        journal_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model()
+        if not journal_ids:
+            return
+        payments = self.env['account.payment'].search([
+            ('journal_id', 'in', journal_ids),
+            ('state', '=', 'draft'),
+        ])
+        payments._refresh_stored_journal_balance()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import models, fields, api, _
+
+
+class JournalBalanceReservation(models.Model):
+    """ Funds earmarked on a bank/cash journal by its draft outgoing payments.
+
+        There is one row per journal; it is the row locked while a payment reserves, releases or
+        checks funds on the journal, so concurrent payments on the same journal are serialized
+        without scanning the payments.
+    """
+    _name = 'sr.journal.balance.reservation'
+    _description = 'Journal Balance Reservation'
+    _rec_name = 'journal_id'
+    _log_access = False
+
+    journal_id = fields.Many2one('account.journal', string='Journal', required=True, readonly=True, ondelete='cascade')
+    reserved_amount = fields.Float(string='Reserved Amount', digits=0, readonly=True,
+                                   help="Total amount of the draft outgoing payments of the journal.")
+
+    _sql_constraints = [
+        ('journal_uniq', 'unique (journal_id)', 'Only one reservation row per journal is allowed.'),
+    ]
+
+    @api.model
+    def _lock(self, journal_ids):
+        """ Lock the rows of the given journals until the end of the transaction, creating them if needed. """
+        journal_ids = sorted(set(journal_ids))
+        if not journal_ids:
+            return
+        self.env.cr.execute("""
+            INSERT INTO sr_journal_balance_reservation (journal_id, reserved_amount)
+                 SELECT journal_id, 0.0
+                   FROM unnest(%s::int[]) AS journal_id
+            ON CONFLICT (journal_id) DO NOTHING
+        """, [journal_ids])
+        # Lock in a stable order to avoid deadlocks between transactions locking several journals.
+        self.env.cr.execute("""
+               SELECT id
+                 FROM sr_journal_balance_reservation
+                WHERE journal_id IN %s
+             ORDER BY journal_id
+           FOR UPDATE
+        """, [tuple(journal_ids)])
+
+    @api.model
+    def _get_reserved_amounts(self, journal_ids):
+        """ Return a mapping journal_id -> reserved amount. """
+        journal_ids = tuple(set(journal_ids))
+        if not journal_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT journal_id, reserved_amount
+              FROM sr_journal_balance_reservation
+             WHERE journal_id IN %s
+        """, [journal_ids])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """ Add the amounts of the mapping journal_id -> delta to the reservations of the journals. """
+        deltas = {journal_id: delta for journal_id, delta in deltas.items() if journal_id and delta}
+        if not deltas:
+            return
+        self._lock(deltas)
+        self.env.cr.execute("""
+            UPDATE sr_journal_balance_reservation reservation
+               SET reserved_amount = reservation.reserved_amount + delta.amount
+              FROM unnest(%s::int[], %s::numeric[]) AS delta(journal_id, amount)
+             WHERE reservation.journal_id = delta.journal_id
+        """, [list(deltas), list(deltas.values())])
+        self.invalidate_model()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import groupby
+
+from .tools import transaction_cache, clear_transaction_cache
+
+JOURNAL_BALANCE_CACHE = 'sr_manual_currency_exchange_rate.journal_balances'
+
+
+class JournalBalanceService(models.AbstractModel):
+    """ Journal balance checks shared by ``account.payment`` and ``account.payment.register``.
+
+        The balances are answered in batch and kept for the transaction per (account, date, currency);
+        the cache is dropped as soon as a move is posted, reset to draft or cancelled.
+    """
+    _name = 'sr.journal.balance.service'
+    _description = 'Journal Balance Service'
+
+    @api.model
+    def _is_balance_checked(self, journal, date):
+        """ Only the bank and cash journals having a liquidity account are checked. """
+        return bool(journal.type in ('bank', 'cash') and journal.default_account_id and date)
+
+    @api.model
+    def _get_balances(self, journal_dates):
+        """ Return the balance of the liquidity account of each journal up to each date.
+
+        :param journal_dates: An iterable of (journal, date) pairs.
+        :return: A mapping (journal_id, date) -> balance, expressed in the currency of the journal.
+                 The journals that are not checked are left out.
+        """
+        cache = transaction_cache(self.env, JOURNAL_BALANCE_CACHE)
+        keys = {}
+        for journal, date in journal_dates:
+            if not self._is_balance_checked(journal, date):
+                continue
+            # The balance field is in company currency so we use amount_currency for foreign currency journals.
+            foreign_currency = journal.currency_id and journal.currency_id != journal.company_id.currency_id
+            currency = journal.currency_id if foreign_currency else journal.company_id.currency_id
+            keys[(journal.id, date)] = (journal.default_account_id.id, date, currency.id, bool(foreign_currency))
+
+        missing_keys = {key for key in keys.values() if key[:3] not in cache}
+        if missing_keys:
+            balances = self.env['sr.liquidity.daily.balance']._read_balances(
+                (account_id, date) for account_id, date, dummy, dummy in missing_keys
+            )
+            for account_id, date, currency_id, foreign_currency in missing_keys:
+                balance, amount_currency = balances[(account_id, date)]
+                cache[(account_id, date, currency_id)] = amount_currency if foreign_currency else balance
+        return {journal_date: cache[key[:3]] for journal_date, key in keys.items()}
+
+    @api.model
+    def _invalidate_cache(self):
+        clear_transaction_cache(self.env, JOURNAL_BALANCE_CACHE)
+
+    @api.model
+    def _exceeds_balance(self, payment_type, journal, amount, balance, available=None):
+        """ Tell if an outgoing amount is greater than the balance available on a bank/cash journal.
+
+        :param balance:   The posted balance of the journal.
+        :param available: The part of the balance that is not reserved by other payments, defaults to ``balance``.
+        """
+        if available is None:
+            available = balance
+        return bool(
+            payment_type == 'outbound'
+            and journal
+            and journal.type in ('bank', 'cash')
+            and amount and balance
+            and amount > available
+        )
+
+    @api.model
+    def _validate_balance(self, payment_type, journal, amount, balance, available=None):
+        """
+        Valida que el diario tenga saldo suficiente para realizar el pago
+        """
+        if self._exceeds_balance(payment_type, journal, amount, balance, available):
+            self._raise_insufficient_balance(amount, balance if available is None else available)
+
+    @api.model
+    def _validate_payments(self, payments):
+        """ Validate the balance of a batch of payments at once.
+
+            The outgoing payments are grouped by journal and checked in date order: each one must fit
+            in the balance at its date minus the funds reserved by other payments and the outflows of
+            the payments of the batch checked before it. The reservation rows of the journals stay
+            locked until the end of the transaction, so concurrent postings cannot overdraw them.
+        """
+        outbound_payments = payments.filtered(
+            lambda p: p.payment_type == 'outbound' and p.amount and self._is_balance_checked(p.journal_id, p.date))
+        balances = self._get_balances((payment.journal_id, payment.date) for payment in outbound_payments)
+        # The funds reserved by the payments outside of the batch are not available.
+        reservation = self.env['sr.journal.balance.reservation']
+        reservation._lock(outbound_payments.journal_id.ids)
+        reserved_amounts = reservation._get_reserved_amounts(outbound_payments.journal_id.ids)
+        for journal, journal_payments in groupby(outbound_payments, key=lambda p: p.journal_id):
+            outflow = reserved_amounts.get(journal.id, 0.0) - sum(
+                payment.reserved_amount for payment in journal_payments if payment.reserved_journal_id == journal)
+            for payment in sorted(journal_payments, key=lambda p: (p.date, p.id)):
+                balance = balances[(journal.id, payment.date)]
+                available = balance - outflow
+                amount = self._get_journal_amount(payment)
+                if balance and amount > available:
+                    self._raise_insufficient_balance(amount, available)
+                outflow += amount
+
+    @api.model
+    def _raise_insufficient_balance(self, amount, balance):
+        raise ValidationError(_(
+            "No se puede confirmar el pago. El monto del pago (%.2f) "
+            "excede el saldo disponible en el diario (%.2f)."
+        ) % (amount, balance))
+
+    @api.model
+    def _get_reserved_amounts(self, journals):
+        """ Return a mapping journal_id -> amount reserved by the draft outgoing payments. """
+        return self.env['sr.journal.balance.reservation']._get_reserved_amounts(journals._origin.ids)
+
+    @api.model
+    def _get_journal_amount(self, payment):
+        """ Return the amount of a payment expressed in the currency of its journal, the one of the balances. """
+        company = payment.company_id
+        journal_currency = payment.journal_id.currency_id or company.currency_id
+        if not payment.currency_id or payment.currency_id == journal_currency:
+            return payment.amount
+        if payment.active_manual_currency_rate and payment.apply_manual_currency_exchange \
+                and payment.manual_currency_exchange_rate:
+            # Same conversion as the journal items of the payment: through the company currency at the manual rate.
+            amount, currency = payment.amount * payment.manual_currency_exchange_rate, company.currency_id
+        else:
+            amount, currency = payment.amount, payment.currency_id
+        return currency._convert(amount, journal_currency, company, payment.date or fields.Date.context_today(self))
+
+    @api.model
+    def _is_reservable(self, payment):
+        return bool(
+            payment.state == 'draft'
+            and payment.payment_type == 'outbound'
+            and payment.amount
+            and self._is_balance_checked(payment.journal_id, payment.date)
+        )
+
+    @api.model
+    def _sync_reservations(self, payments, release=False):
+        """ Earmark the amount of the draft outgoing payments on their journal and release the
+            reservations of the other payments, or of all of them when ``release`` is set.
+        """
+        deltas = defaultdict(float)
+        values = []
+        for payment in payments:
+            if not release and self._is_reservable(payment):
+                journal, amount = payment.journal_id, self._get_journal_amount(payment)
+            else:
+                journal, amount = payment.journal_id.browse(), 0.0
+            if journal == payment.reserved_journal_id and amount == payment.reserved_amount:
+                continue
+            deltas[payment.reserved_journal_id.id] -= payment.reserved_amount
+            deltas[journal.id] += amount
+            values.append((payment.id, journal.id or None, amount))
+        if not values:
+            return
+
+        self.env['sr.journal.balance.reservation']._apply_deltas(deltas)
+        # The funds available for the other draft payments of these journals changed.
+        journal_ids = [journal_id for journal_id in deltas if journal_id]
+        self.env['sr.journal.balance.queue']._enqueue(self.env['account.journal'].browse(journal_ids))
+        payment_ids, journal_ids, amounts = (list(column) for column in zip(*values))
+        self.env.cr.execute("""
+            UPDATE account_payment payment
+               SET reserved_journal_id = reservation.journal_id,
+                   reserved_amount = reservation.amount
+              FROM unnest(%s::int[], %s::int[], %s::numeric[]) AS reservation(payment_id, journal_id, amount)
+             WHERE payment.id = reservation.payment_id
+        """, [payment_ids, journal_ids, amounts])
+        payments.invalidate_recordset(['reserved_journal_id', 'reserved_amount'])
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import models, fields, api, _
+
+
+class LiquidityBalanceLock(models.Model):
+    """ One row per liquidity account, bumped by every transaction changing its running balances.
+
+        The transactions (re)building or updating the rows of an account all write its lock row, so
+        they are serialized, and under the repeatable read isolation of the cursors the second one
+        fails with a serialization error and is retried instead of missing the rows of the first one.
+    """
+    _name = 'sr.liquidity.balance.lock'
+    _description = 'Liquidity Account Balance Lock'
+    _rec_name = 'account_id'
+    _log_access = False
+
+    account_id = fields.Many2one('account.account', string='Account', required=True, readonly=True, ondelete='cascade')
+    version = fields.Integer(string='Version', readonly=True)
+
+    _sql_constraints = [
+        ('account_uniq', 'unique (account_id)', 'Only one lock row per account is allowed.'),
+    ]
+
+    @api.model
+    def _lock(self, account_ids):
+        """ Write the lock rows of the given accounts, creating them if needed. """
+        account_ids = sorted(set(account_ids))
+        if not account_ids:
+            return
+        # Lock in a stable order to avoid deadlocks between transactions locking several accounts.
+        self.env.cr.execute("""
+            INSERT INTO sr_liquidity_balance_lock (account_id, version)
+                 SELECT account_id, 1
+                   FROM unnest(%s::int[]) AS account_id
+               ORDER BY account_id
+            ON CONFLICT (account_id) DO UPDATE SET version = sr_liquidity_balance_lock.version + 1
+        """, [account_ids])
+        self.invalidate_model()
+
+
+class LiquidityDailyBalance(models.Model):
+    """ Running balance of the posted journal items of a liquidity account at the end of each day
+        having movements. The balance at any date is the row of the latest day before or at that date.
+
+        The rows of an account are built the first time its balance is requested, then kept up to date
+        incrementally when moves are posted, reset to draft or cancelled, and when the journal items of
+        posted moves are created, edited or removed.
+    """
+    _name = 'sr.liquidity.daily.balance'
+    _description = 'Liquidity Account Daily Balance'
+    _order = 'account_id, date'
+    _log_access = False
+
+    account_id = fields.Many2one('account.account', string='Account', required=True, readonly=True, ondelete='cascade')
+    date = fields.Date(string='Date', required=True, readonly=True)
+    balance = fields.Float(string='Balance', digits=0, readonly=True,
+                           help="Running balance in company currency at the end of the day.")
+    amount_currency = fields.Float(string='Amount in Currency', digits=0, readonly=True,
+                                   help="Running balance in the currency of the journal items at the end of the day.")
+
+    _sql_constraints = [
+        ('account_date_uniq', 'unique (account_id, date)', 'Only one running balance per account and day is allowed.'),
+    ]
+
+    @api.model
+    def _read_balances(self, account_dates):
+        """ Return the posted balance of each account up to each date, reading one row per pair.
+
+        :param account_dates: An iterable of (account_id, date) pairs.
+        :return: A mapping (account_id, date) -> (balance, amount_currency).
+        """
+        account_dates = set(account_dates)
+        if not account_dates:
+            return {}
+        account_ids, dates = zip(*account_dates)
+        self._build_missing_accounts(set(account_ids))
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT req.account_id,
+                   req.date,
+                   COALESCE(running.balance, 0.0),
+                   COALESCE(running.amount_currency, 0.0)
+              FROM unnest(%s::int[], %s::date[]) AS req(account_id, date)
+         LEFT JOIN LATERAL (
+                    SELECT daily.balance, daily.amount_currency
+                      FROM sr_liquidity_daily_balance daily
+                     WHERE daily.account_id = req.account_id
+                       AND daily.date <= req.date
+                  ORDER BY daily.date DESC
+                     LIMIT 1
+                   ) running ON TRUE
+        """, [list(account_ids), list(dates)])
+        return {
+            (account_id, date): (balance, amount_currency)
+            for account_id, date, balance, amount_currency in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _build_missing_accounts(self, account_ids):
+        """ Build the rows of the accounts that are not tracked yet. """
+        self.env.cr.execute("""
+            SELECT DISTINCT account_id
+              FROM sr_liquidity_daily_balance
+             WHERE account_id IN %s
+        """, [tuple(account_ids)])
+        missing_account_ids = set(account_ids) - {row[0] for row in self.env.cr.fetchall()}
+        if missing_account_ids:
+            self._rebuild(missing_account_ids)
+
+    @api.model
+    def _rebuild(self, account_ids):
+        """ (Re)compute from scratch the rows of the given accounts from their posted journal items. """
+        account_ids = tuple(account_ids)
+        if not account_ids:
+            return
+        self.env['sr.liquidity.balance.lock']._lock(account_ids)
+        self.env['account.move.line'].flush_model(['account_id', 'date', 'parent_state', 'balance', 'amount_currency'])
+        self.env.cr.execute("DELETE FROM sr_liquidity_daily_balance WHERE account_id IN %s", [account_ids])
+        self.env.cr.execute("""
+            INSERT INTO sr_liquidity_daily_balance (account_id, date, balance, amount_currency)
+                 SELECT line.account_id,
+                        line.date,
+                        SUM(SUM(line.balance)) OVER (PARTITION BY line.account_id ORDER BY line.date),
+                        SUM(SUM(line.amount_currency)) OVER (PARTITION BY line.account_id ORDER BY line.date)
+                   FROM account_move_line line
+                  WHERE line.account_id IN %s
+                    AND line.parent_state = 'posted'
+               GROUP BY line.account_id, line.date
+            ON CONFLICT (account_id, date) DO NOTHING
+        """, [account_ids])
+        self.invalidate_model()
+
+    @api.model
+    def _apply_moves(self, moves, sign):
+        """ Add (``sign=1``) or remove (``sign=-1``) the journal items of ``moves`` on the tracked accounts. """
+        if moves:
+            self._apply_journal_items('move_id', moves.ids, sign)
+
+    @api.model
+    def _apply_lines(self, lines, sign):
+        """ Add (``sign=1``) or remove (``sign=-1``) the journal items ``lines`` on the tracked accounts. """
+        if lines:
+            self._apply_journal_items('id', lines.ids, sign)
+
+    @api.model
+    def _apply_journal_items(self, column, ids, sign):
+        """ Apply the journal items whose ``column`` ('id' or 'move_id') is in ``ids``. """
+        assert column in ('id', 'move_id')
+        self.env['account.move.line'].flush_model(['move_id', 'account_id', 'date', 'balance', 'amount_currency'])
+        # Lock the tracked accounts, but also the liquidity accounts of the journals that may be built
+        # concurrently: a rebuild that cannot see these lines yet must conflict with this transaction.
+        self.env.cr.execute("""
+            SELECT DISTINCT line.account_id
+              FROM account_move_line line
+             WHERE line.%s IN %%s
+               AND (
+                    EXISTS (SELECT 1 FROM sr_liquidity_daily_balance daily WHERE daily.account_id = line.account_id)
+                    OR line.account_id IN (
+                        SELECT journal.default_account_id
+                          FROM account_journal journal
+                         WHERE journal.type IN ('bank', 'cash')
+                    )
+               )
+        """ % column, [tuple(ids)])
+        self.env['sr.liquidity.balance.lock']._lock([row[0] for row in self.env.cr.fetchall()])
+        self.env.cr.execute("""
+            SELECT line.account_id,
+                   line.date,
+                   SUM(line.balance),
+                   SUM(line.amount_currency)
+              FROM account_move_line line
+             WHERE line.%s IN %%s
+               AND EXISTS (SELECT 1 FROM sr_liquidity_daily_balance daily WHERE daily.account_id = line.account_id)
+          GROUP BY line.account_id, line.date
+        """ % column, [tuple(ids)])
+        self._apply_deltas([
+            (account_id, date, sign * balance, sign * amount_currency)
+            for account_id, date, balance, amount_currency in self.env.cr.fetchall()
+        ])
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """ Apply a list of (account_id, date, balance, amount_currency) movements to the running balances. """
+        if not deltas:
+            return
+        account_ids, dates, balances, amounts_currency = (list(column) for column in zip(*deltas))
+        # Make sure every day receiving a movement has its row, starting from the running balance of
+        # the previous day. The rows of the following days are shifted by the update below.
+        self.env.cr.execute("""
+            INSERT INTO sr_liquidity_daily_balance (account_id, date, balance, amount_currency)
+                 SELECT delta.account_id,
+                        delta.date,
+                        COALESCE(previous.balance, 0.0),
+                        COALESCE(previous.amount_currency, 0.0)
+                   FROM unnest(%s::int[], %s::date[]) AS delta(account_id, date)
+              LEFT JOIN LATERAL (
+                        SELECT daily.balance, daily.amount_currency
+                          FROM sr_liquidity_daily_balance daily
+                         WHERE daily.account_id = delta.account_id
+                           AND daily.date < delta.date
+                      ORDER BY daily.date DESC
+                         LIMIT 1
+                        ) previous ON TRUE
+            ON CONFLICT (account_id, date) DO NOTHING
+        """, [account_ids, dates])
+        self.env.cr.execute("""
+            UPDATE sr_liquidity_daily_balance daily
+               SET balance = daily.balance + shift.balance,
+                   amount_currency = daily.amount_currency + shift.amount_currency
+              FROM (
+                    SELECT following.id,
+                           SUM(delta.balance) AS balance,
+                           SUM(delta.amount_currency) AS amount_currency
+                      FROM unnest(%s::int[], %s::date[], %s::numeric[], %s::numeric[])
+                           AS delta(account_id, date, balance, amount_currency)
+                      JOIN sr_liquidity_daily_balance following
+                        ON following.account_id = delta.account_id
+                       AND following.date >= delta.date
+                  GROUP BY following.id
+                   ) shift
+             WHERE daily.id = shift.id
+        """, [account_ids, dates, balances, amounts_currency])
+        self.invalidate_model()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from collections import defaultdict
+
+from odoo import models, fields, api, _, Command
+from odoo.tools import groupby
+
+
+class ManualRateRevaluation(models.AbstractModel):
+    """ Revaluation of the goods received on purchase orders whose manual rate changed afterwards.
+
+        The incoming valuation layers of the FIFO and average cost products of the orders are corrected
+        by the difference between the new and the old rate, relative to the rate of the receipt: the part still in stock is added to the layers like a landed cost, the consumed
+        part goes to the expense account, and one journal entry is posted per product.
+    """
+    _name = 'sr.manual.rate.revaluation'
+    _description = 'Manual Rate Revaluation'
+
+    @api.model
+    def _get_incoming_layers(self, order_ids):
+        """ Return the (layer id, order id) of the incoming valuation layers of the done receipts of the orders. """
+        self.env['stock.valuation.layer'].flush_model(['stock_move_id', 'stock_valuation_layer_id', 'quantity'])
+        self.env['stock.move'].flush_model(['purchase_line_id', 'state'])
+        self.env['purchase.order.line'].flush_model(['order_id'])
+        self.env.cr.execute("""
+            SELECT layer.id, line.order_id
+              FROM stock_valuation_layer layer
+              JOIN stock_move move ON move.id = layer.stock_move_id
+              JOIN purchase_order_line line ON line.id = move.purchase_line_id
+             WHERE line.order_id IN %s
+               AND move.state = 'done'
+               AND layer.stock_valuation_layer_id IS NULL
+               AND layer.quantity > 0
+          ORDER BY layer.id
+        """, [tuple(order_ids)])
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _compute_revaluations(self, old_rates, new_rates):
+        """ Compute the revaluations of the receipts of the orders whose rate goes from ``old_rates`` to ``new_rates``.
+
+        :param old_rates: A mapping order id -> manual rate used so far to value its receipts.
+        :param new_rates: A mapping order id -> manual rate to value them with.
+        :return: A list of dictionaries, one per valuation layer to correct:
+            * layer:           The incoming stock.valuation.layer, of a product valued in FIFO or average cost.
+            * receipt_rate:    The manual rate its value was computed with at the receipt.
+            * value:           The total correction of its value, in company currency.
+            * remaining_value: The part of the correction on the quantity still in stock.
+            * consumed_value:  The part of the correction on the quantity already delivered.
+        """
+        order_ids = [
+            order_id for order_id, old_rate in old_rates.items()
+            if old_rate and new_rates.get(order_id) and new_rates[order_id] != old_rate
+        ]
+        if not order_ids:
+            return []
+        rows = self._get_incoming_layers(order_ids)
+        layers = self.env['stock.valuation.layer'].sudo().browse([layer_id for layer_id, dummy in rows])
+        revaluations = []
+        for layer, (dummy, order_id) in zip(layers, rows):
+            # Standard cost products are valued at their standard price, not at the purchase price.
+            if layer.product_id.with_company(layer.company_id).cost_method not in ('fifo', 'average'):
+                continue
+            # The layer value was computed at the receipt rate: the layers received before the rate was
+            # recorded on them were valued at the rate in place until now.
+            receipt_rate = layer.manual_currency_exchange_rate or old_rates[order_id]
+            currency = layer.company_id.currency_id
+            value = currency.round(layer.value * (new_rates[order_id] - old_rates[order_id]) / receipt_rate)
+            if currency.is_zero(value):
+                continue
+            remaining_value = currency.round(value * layer.remaining_qty / layer.quantity)
+            revaluations.append({
+                'layer': layer,
+                'receipt_rate': receipt_rate,
+                'value': value,
+                'remaining_value': remaining_value,
+                'consumed_value': value - remaining_value,
+            })
+        return revaluations
+
+    @api.model
+    def _apply_revaluations(self, revaluations):
+        """ Post the revaluations returned by ``_compute_revaluations``. """
+        if not revaluations:
+            return
+        date = fields.Date.context_today(self)
+
+        # Record the receipt rate on the layers, so that the next rate change is computed from it.
+        for revaluation in revaluations:
+            if not revaluation['layer'].manual_currency_exchange_rate:
+                revaluation['layer'].manual_currency_exchange_rate = revaluation['receipt_rate']
+
+        # One journal entry per product, for the products valued in real time.
+        move_vals_list = []
+        move_keys = []
+        real_time_revaluations = [
+            r for r in revaluations
+            if r['layer'].product_id.with_company(r['layer'].company_id).valuation == 'real_time'
+        ]
+        for (product, company), items in groupby(real_time_revaluations, key=lambda r: (r['layer'].product_id, r['layer'].company_id)):
+            accounts = product.product_tmpl_id.with_company(company).get_product_accounts()
+            balances = defaultdict(float)
+            for item in items:
+                balances[accounts['stock_input'].id] -= item['value']
+                balances[accounts['stock_valuation'].id] += item['remaining_value']
+                balances[accounts['expense'].id] += item['consumed_value']
+            name = _("%s - Manual rate revaluation", product.display_name)
+            move_vals_list.append({
+                'journal_id': accounts['stock_journal'].id,
+                'company_id': company.id,
+                'date': date,
+                'ref': name,
+                'move_type': 'entry',
+                'line_ids': [
+                    Command.create({
+                        'name': name,
+                        'product_id': product.id,
+                        'account_id': account_id,
+                        'debit': balance if balance > 0.0 else 0.0,
+                        'credit': -balance if balance < 0.0 else 0.0,
+                    })
+                    for account_id, balance in balances.items()
+                    if not company.currency_id.is_zero(balance)
+                ],
+            })
+            move_keys.append((product, company))
+        account_moves = self.env['account.move'].sudo().create(move_vals_list)
+        account_moves._post()
+        account_move_per_key = dict(zip(move_keys, account_moves))
+
+        # The part still in stock is added to the layers, like a landed cost.
+        svl_vals_list = []
+        for revaluation in revaluations:
+            layer = revaluation['layer']
+            if layer.company_id.currency_id.is_zero(revaluation['remaining_value']):
+                continue
+            account_move = account_move_per_key.get((layer.product_id, layer.company_id))
+            svl_vals_list.append({
+                'company_id': layer.company_id.id,
+                'product_id': layer.product_id.id,
+                'description': _("Manual rate revaluation"),
+                'stock_move_id': layer.stock_move_id.id,
+                'stock_valuation_layer_id': layer.id,
+                'account_move_id': account_move.id if account_move else False,
+                'value': revaluation['remaining_value'],
+                'unit_cost': 0.0,
+                'quantity': 0.0,
+                'remaining_qty': 0.0,
+            })
+            layer.remaining_value += revaluation['remaining_value']
+            product = layer.product_id.with_company(layer.company_id)
+            if product.cost_method == 'average' and product.quantity_svl:
+                product.sudo().with_context(disable_auto_svl=True).standard_price += \
+                    revaluation['remaining_value'] / product.quantity_svl
+        self.env['stock.valuation.layer'].sudo().create(svl_vals_list)
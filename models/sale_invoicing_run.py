@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.tools import groupby
+
+_logger = logging.getLogger(__name__)
+
+
+class SaleInvoicingRun(models.Model):
+    """ Checkpoint of the invoicing of a large set of sale orders.
+
+        The orders are invoiced by chunks, each one in its own transaction with the run locked,
+        grouped by currency and manual rate so that an invoice never mixes orders converted at
+        different rates. The runs are processed by the cron, outside of the transaction creating
+        them. The orders still to invoice are kept on the run: after a crash or a concurrent update,
+        the cron resumes it where it stopped.
+    """
+    _name = 'sr.sale.invoicing.run'
+    _description = 'Sale Orders Invoicing Run'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, readonly=True, default=lambda self: _('Invoicing Run'))
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, readonly=True, default='running')
+    chunk_size = fields.Integer(string='Chunk Size', required=True, readonly=True, default=500)
+    pending_order_ids = fields.Many2many('sale.order', 'sr_sale_invoicing_run_order_rel', 'run_id', 'order_id',
+                                         string='Orders To Invoice', readonly=True)
+    processed_count = fields.Integer(string='Processed Orders', readonly=True)
+    invoice_count = fields.Integer(string='Created Invoices', readonly=True)
+    duration = fields.Float(string='Duration (s)', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    @api.model
+    def _start(self, orders, chunk_size=500):
+        """ Create a run invoicing ``orders`` and hand it to the cron.
+
+            Nothing is committed here: the run is processed once the current transaction is committed,
+            and not at all if it is rolled back.
+        """
+        run = self.create({'chunk_size': chunk_size, 'pending_order_ids': [(6, 0, orders.ids)]})
+        self._trigger_processing()
+        return run
+
+    @api.model
+    def _trigger_processing(self, at=None):
+        """ Let the cron process the running runs, as soon as possible or at the given datetime. """
+        cron = self.env.ref('sr_manual_currency_exchange_rate.ir_cron_sale_invoicing_run', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(at=at)
+
+    def _get_next_chunk(self):
+        self.ensure_one()
+        self.env.cr.execute("""
+              SELECT order_id
+                FROM sr_sale_invoicing_run_order_rel
+               WHERE run_id = %s
+            ORDER BY order_id
+               LIMIT %s
+        """, [self.id, self.chunk_size])
+        return self.env['sale.order'].browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _try_lock(self):
+        """ Lock the run until the end of the transaction, unless another worker is processing it. """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    SELECT id
+                      FROM sr_sale_invoicing_run
+                     WHERE id = %s
+                       FOR UPDATE SKIP LOCKED
+                """, [self.id])
+                locked = bool(self.env.cr.fetchone())
+        except psycopg2.errors.SerializationFailure:
+            # Another worker committed a chunk of this run since our transaction started.
+            return False
+        if locked:
+            self.invalidate_recordset()
+        return locked
+
+    def _process(self):
+        """ Invoice the pending orders chunk by chunk, committing after each chunk.
+
+            Every chunk is processed with the run locked; a run locked by another worker (a user or
+            the cron) is left to it.
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        for run in self:
+            if not run._try_lock():
+                _logger.info("Invoicing run %s is being processed by another worker, skipped", run.id)
+                continue
+            run.write({'state': 'running', 'last_error': False})
+            if not testing:
+                # Checkpoint the run itself before any chunk, so a failing chunk cannot roll it back.
+                self.env.cr.commit()
+            while True:
+                # The lock is released by each commit: if another worker took the run over, let it go on.
+                if not run._try_lock() or run.state != 'running':
+                    break
+                orders = run._get_next_chunk()
+                if not orders:
+                    run.state = 'done'
+                    if not testing:
+                        self.env.cr.commit()
+                    break
+                start = time.time()
+                try:
+                    invoices = run._invoice_chunk(orders)
+                except (psycopg2.errors.SerializationFailure, psycopg2.OperationalError):
+                    if testing:
+                        raise
+                    # A concurrent update or a lock timeout, not a failure of the run: retry the chunk later.
+                    self.env.cr.rollback()
+                    _logger.warning("Invoicing run %s hit a concurrent update, retried later", run.id, exc_info=True)
+                    self._trigger_processing(at=fields.Datetime.now() + timedelta(minutes=1))
+                    self.env.cr.commit()
+                    break
+                except Exception as e:
+                    if testing:
+                        raise
+                    self.env.cr.rollback()
+                    _logger.exception("Invoicing run %s failed", run.id)
+                    if run._try_lock():
+                        run.write({'state': 'failed', 'last_error': str(e)})
+                        self.env.cr.commit()
+                    break
+                duration = time.time() - start
+                run.write({
+                    'pending_order_ids': [(3, order_id) for order_id in orders.ids],
+                    'processed_count': run.processed_count + len(orders),
+                    'invoice_count': run.invoice_count + len(invoices),
+                    'duration': run.duration + duration,
+                })
+                _logger.info(
+                    "Invoicing run %s: %s orders invoiced in %.2fs (%.0f orders/s), %s processed so far",
+                    run.id, len(orders), duration, len(orders) / duration if duration else 0.0, run.processed_count,
+                )
+                if not testing:
+                    self.env.cr.commit()
+                # Keep the memory bounded: nothing of the previous chunk is needed anymore.
+                self.env.invalidate_all()
+
+    def _invoice_chunk(self, orders):
+        """ Invoice a chunk of orders, one ``_create_invoices`` call per currency and manual rate. """
+        invoices = self.env['account.move']
+        orders = orders.filtered(lambda order: order.invoice_status == 'to invoice')
+        for dummy, group in groupby(orders, key=lambda order: (
+            order.currency_id,
+            order.active_manual_currency_rate,
+            order.apply_manual_currency_exchange,
+            order.manual_currency_exchange_rate,
+        )):
+            invoices |= self.env['sale.order'].concat(*group)._create_invoices()
+        return invoices
+
+    def action_resume(self):
+        runs = self.filtered(lambda run: run.state != 'done')
+        runs.write({'state': 'running', 'last_error': False})
+        self._trigger_processing()
+
+    @api.model
+    def _cron_resume_runs(self):
+        """ Process the running runs: the new ones, and the ones interrupted by a crash, a timeout or a
+            concurrent update. The runs still being processed by another worker are skipped.
+        """
+        self.search([('state', '=', 'running')])._process()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+TRANSACTION_CACHE_KEYS = 'sr_manual_currency_exchange_rate.transaction_cache_keys'
+
+
+def transaction_cache(env, key, factory=dict):
+    """ Return a cache stored on the cursor of ``env`` under ``key``.
+
+    The cache lives until the end of the current transaction: it is dropped
+    after the next commit or rollback of the cursor, so nothing leaks from one
+    transaction to the next (e.g. between the batches of a cron).
+    """
+    cr_cache = env.cr.cache
+    keys = cr_cache.get(TRANSACTION_CACHE_KEYS)
+    if keys is None:
+        # One cleanup per transaction for all the keys, however often they are cleared and recreated.
+        keys = cr_cache[TRANSACTION_CACHE_KEYS] = set()
+
+        def cleanup():
+            for cached_key in keys:
+                cr_cache.pop(cached_key, None)
+            cr_cache.pop(TRANSACTION_CACHE_KEYS, None)
+
+        env.cr.postcommit.add(cleanup)
+        env.cr.postrollback.add(cleanup)
+    if key not in cr_cache:
+        cr_cache[key] = factory()
+        keys.add(key)
+    return cr_cache[key]
+
+
+def clear_transaction_cache(env, key):
+    """ Drop the transaction cache stored under ``key``, if any. """
+    env.cr.cache.pop(key, None)
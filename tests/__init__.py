@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from . import test_rate_override_benchmark
+from . import test_sync_invoice_benchmark
+from . import test_sync_invoice_memory
+from . import test_bulk_reconciliation_benchmark
+from . import test_purchase_line_names_benchmark
+from . import test_receipt_valuation_benchmark
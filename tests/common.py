@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+import logging
+import time
+from contextlib import contextmanager
+
+from odoo import fields, Command
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+_logger = logging.getLogger(__name__)
+
+
+class ManualRateBenchmarkCommon(AccountTestInvoicingCommon):
+    """ Data and measuring helpers shared by the benchmarks of the module.
+
+        The benchmarks are tagged ``benchmark`` and compare query counts rather than timings, so that
+        they stay meaningful on any machine; the timings are only logged.
+    """
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.foreign_currency = cls.currency_data['currency']
+        cls.manual_rate = 1.5
+        cls.fifo_category = cls.env['product.category'].create({
+            'name': 'Benchmark FIFO',
+            'property_cost_method': 'fifo',
+            'property_valuation': 'manual_periodic',
+        })
+        cls.benchmark_products = cls.env['product.product'].create([{
+            'name': 'Benchmark product %s' % index,
+            'type': 'product',
+            'categ_id': cls.fifo_category.id,
+            'standard_price': 10.0 + index,
+            'lst_price': 20.0 + index,
+            'taxes_id': [Command.set(cls.company_data['default_tax_sale'].ids)],
+            'supplier_taxes_id': [Command.set(cls.company_data['default_tax_purchase'].ids)],
+        } for index in range(5)])
+
+    @contextmanager
+    def measure(self, label, size):
+        """ Count the queries and the time spent in the block, flushes included.
+
+            Yield a dictionary that holds ``queries`` and ``duration`` after the block.
+        """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        result = {}
+        start_count = self.env.cr.sql_log_count
+        start = time.time()
+        yield result
+        self.env.flush_all()
+        result['queries'] = self.env.cr.sql_log_count - start_count
+        result['duration'] = time.time() - start
+        _logger.info(
+            "%s: %s queries (%.2f per record) in %.2fs for %s records",
+            label, result['queries'], result['queries'] / size, result['duration'], size,
+        )
+
+    def _create_manual_rate_invoice(self, size, move_type='out_invoice', rate=None):
+        """ Create a draft invoice in foreign currency with a manual rate and ``size`` product lines. """
+        return self.env['account.move'].create({
+            'move_type': move_type,
+            'partner_id': self.partner_a.id,
+            'invoice_date': fields.Date.today(),
+            'currency_id': self.foreign_currency.id,
+            'active_manual_currency_rate': True,
+            'apply_manual_currency_exchange': True,
+            'manual_currency_exchange_rate': rate or self.manual_rate,
+            'invoice_line_ids': [Command.create({
+                'product_id': self.benchmark_products[index % len(self.benchmark_products)].id,
+                'quantity': 1.0 + index % 3,
+                'price_unit': 10.0 + index % 7,
+            }) for index in range(size)],
+        })
+
+    def _create_manual_rate_purchase_order(self, size, rate=None):
+        """ Create a purchase order in foreign currency with a manual rate and ``size`` lines. """
+        return self.env['purchase.order'].create({
+            'partner_id': self.partner_a.id,
+            'currency_id': self.foreign_currency.id,
+            'active_manual_currency_rate': True,
+            'apply_manual_currency_exchange': True,
+            'manual_currency_exchange_rate': rate or self.manual_rate,
+            'order_line': [Command.create({
+                'product_id': self.benchmark_products[index % len(self.benchmark_products)].id,
+                'product_qty': 1.0 + index % 3,
+                'price_unit': 10.0,
+                'date_planned': fields.Datetime.now(),
+            }) for index in range(size)],
+        })
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo.tests import tagged
+
+from .common import ManualRateBenchmarkCommon
+
+PAIR_COUNT = 100
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestBulkReconciliationBenchmark(ManualRateBenchmarkCommon):
+
+    def _create_pairs(self):
+        """ Return the receivable lines of ``PAIR_COUNT`` posted invoices and of their credit notes,
+            at different manual rates so that exchange differences are created.
+        """
+        invoices = self.env['account.move']
+        refunds = self.env['account.move']
+        for index in range(PAIR_COUNT):
+            invoices |= self._create_manual_rate_invoice(1, rate=self.manual_rate)
+            refunds |= self._create_manual_rate_invoice(1, move_type='out_refund', rate=self.manual_rate + 0.1)
+        (invoices | refunds).action_post()
+        receivable = lambda moves: moves.line_ids.filtered(lambda line: line.account_type == 'asset_receivable')
+        return receivable(invoices), receivable(refunds)
+
+    def test_bulk_reconciliation_queries(self):
+        """ Reconciling the whole set at once costs fewer queries than reconciling it pair by pair. """
+        invoice_lines, refund_lines = self._create_pairs()
+        with self.measure("Reconciliation pair by pair", PAIR_COUNT) as per_pair:
+            for invoice_line, refund_line in zip(invoice_lines, refund_lines):
+                (invoice_line | refund_line).reconcile()
+        self.assertTrue(all((invoice_lines | refund_lines).mapped('reconciled')))
+
+        invoice_lines, refund_lines = self._create_pairs()
+        with self.measure("Bulk reconciliation", PAIR_COUNT) as bulk:
+            (invoice_lines | refund_lines)._reconcile_manual_rate_bulk()
+        self.assertTrue(all((invoice_lines | refund_lines).mapped('reconciled')))
+
+        self.assertLess(bulk['queries'], per_pair['queries'])
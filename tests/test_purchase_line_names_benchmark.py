@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+import logging
+
+from odoo.tests import tagged
+
+from odoo.addons.sr_manual_currency_exchange_rate.models.inherited_purchase_order import KEEP_PURCHASE_LINE_NAMES_PARAM
+from .common import ManualRateBenchmarkCommon
+
+_logger = logging.getLogger(__name__)
+
+ORDER_SIZE = 500
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestPurchaseLineNamesBenchmark(ManualRateBenchmarkCommon):
+
+    def _recompute_lines(self, order, label):
+        lines = order.order_line
+        names = lines.mapped('name')
+        lines.price_unit = 0.0
+        with self.measure(label, ORDER_SIZE) as result:
+            lines._compute_price_unit_and_date_planned_and_name()
+        self.assertEqual(lines.mapped('name'), names)
+        return result
+
+    def test_keep_purchase_line_names(self):
+        """ Keeping the names of the lines whose product did not change skips their description. """
+        order = self._create_manual_rate_purchase_order(ORDER_SIZE)
+        param = self.env['ir.config_parameter'].sudo()
+
+        param.set_param(KEEP_PURCHASE_LINE_NAMES_PARAM, False)
+        default = self._recompute_lines(order, "Purchase line names recomputed")
+        param.set_param(KEEP_PURCHASE_LINE_NAMES_PARAM, True)
+        kept = self._recompute_lines(order, "Purchase line names kept")
+
+        _logger.info(
+            "Keeping the purchase line names saved %s queries and %.2fs on %s lines",
+            default['queries'] - kept['queries'], default['duration'] - kept['duration'], ORDER_SIZE,
+        )
+        self.assertLessEqual(kept['queries'], default['queries'])
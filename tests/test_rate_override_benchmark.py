@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo.tests import tagged
+
+from .common import ManualRateBenchmarkCommon
+
+ORDER_SIZE = 500
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestRateOverrideBenchmark(ManualRateBenchmarkCommon):
+
+    def test_rate_override_scope_queries(self):
+        """ The rate override scope keeps one environment: the lines are read in batch, where the legacy
+            context keys read them again for every line.
+        """
+        order = self._create_manual_rate_purchase_order(ORDER_SIZE)
+        currency = self.env['res.currency']
+        company = order.company_id
+
+        with self.measure("Legacy manual rate context", ORDER_SIZE) as legacy:
+            legacy_rates = []
+            for line in order.order_line:
+                line = line.with_context(active_manutal_currency=True, manual_rate=order.manual_currency_exchange_rate)
+                legacy_rates.append(line.env['res.currency']._get_conversion_rate(
+                    company.currency_id, order.currency_id, company, order.date_order) * line.product_id.standard_price)
+
+        with self.measure("Rate override scope", ORDER_SIZE) as scope:
+            scope_rates = []
+            with order._manual_rate_scope():
+                for line in order.order_line:
+                    scope_rates.append(currency._get_conversion_rate(
+                        company.currency_id, order.currency_id, company, order.date_order) * line.product_id.standard_price)
+
+        self.assertEqual(scope_rates, legacy_rates)
+        self.assertLess(scope['queries'], legacy['queries'])
+        self.assertLess(scope['queries'], ORDER_SIZE)
+
+    def test_purchase_line_pricing_queries(self):
+        """ Recomputing the prices of a 500-line manual-rate order must not cost a query per line. """
+        order = self._create_manual_rate_purchase_order(ORDER_SIZE)
+        lines = order.order_line
+        # Without a price the lines take the manual-rate standard price again.
+        lines.price_unit = 0.0
+        with self.measure("Purchase line pricing", ORDER_SIZE) as result:
+            lines._compute_price_unit_and_date_planned_and_name()
+        self.assertLess(result['queries'], ORDER_SIZE)
+        for line in lines:
+            self.assertAlmostEqual(
+                line.price_unit,
+                line.product_id.standard_price * self.manual_rate,
+                places=2,
+            )
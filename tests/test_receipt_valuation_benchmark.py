@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo.tests import tagged
+
+from .common import ManualRateBenchmarkCommon
+
+RECEIPT_SIZE = 200
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestReceiptValuationBenchmark(ManualRateBenchmarkCommon):
+
+    def _validate_receipt(self, order, label):
+        order.button_confirm()
+        picking = order.picking_ids
+        moves = picking.move_ids
+        self.assertEqual(len(moves), RECEIPT_SIZE)
+        for move in moves:
+            move.quantity = move.product_uom_qty
+        moves.picked = True
+        with self.measure(label, RECEIPT_SIZE) as result:
+            picking.button_validate()
+        self.assertEqual(picking.state, 'done')
+        return moves, result
+
+    def test_large_receipt_valuation(self):
+        """ The layers of a large manual-rate receipt are valued at the rate of the order, without reading
+            the purchase order again for every move: the receipt costs no more queries than a receipt at
+            the standard rates.
+        """
+        standard_order = self._create_manual_rate_purchase_order(RECEIPT_SIZE)
+        standard_order.apply_manual_currency_exchange = False
+        dummy, standard = self._validate_receipt(standard_order, "Standard-rate receipt validation")
+
+        order = self._create_manual_rate_purchase_order(RECEIPT_SIZE)
+        moves, manual = self._validate_receipt(order, "Manual-rate receipt validation")
+        for move in moves:
+            layer = move.stock_valuation_layer_ids
+            self.assertEqual(len(layer), 1)
+            self.assertAlmostEqual(
+                layer.unit_cost,
+                move.purchase_line_id.price_unit * order.manual_currency_exchange_rate,
+                places=2,
+            )
+            self.assertEqual(layer.manual_currency_exchange_rate, order.manual_currency_exchange_rate)
+        # A few queries for the whole receipt at most, none per move.
+        self.assertLess(manual['queries'] - standard['queries'], RECEIPT_SIZE)
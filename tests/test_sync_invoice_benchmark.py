@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+from odoo import Command
+from odoo.tests import tagged
+
+from .common import ManualRateBenchmarkCommon
+
+LARGE_INVOICE_SIZE = 500
+SMALL_INVOICE_SIZE = 5
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestSyncInvoiceBenchmark(ManualRateBenchmarkCommon):
+
+    def _edit_one_line(self, invoice, label):
+        line = invoice.invoice_line_ids[0]
+        with self.measure(label, len(invoice.invoice_line_ids)) as result:
+            invoice.write({'invoice_line_ids': [Command.update(line.id, {'price_unit': 42.0})]})
+        self.assertEqual(line.price_unit, 42.0)
+        self.assertAlmostEqual(line.balance, -42.0 * line.quantity * self.manual_rate, places=2)
+        return result
+
+    def test_edit_one_line_of_large_invoice(self):
+        """ Only the edited line is synchronized: editing one line of a large invoice costs about as many
+            queries as editing one line of a small one.
+        """
+        small_invoice = self._create_manual_rate_invoice(SMALL_INVOICE_SIZE)
+        large_invoice = self._create_manual_rate_invoice(LARGE_INVOICE_SIZE)
+        small = self._edit_one_line(small_invoice, "Edit one line of a small invoice")
+        large = self._edit_one_line(large_invoice, "Edit one line of a large invoice")
+        self.assertLessEqual(large['queries'], 2 * small['queries'])
+        self.assertLess(large['queries'], LARGE_INVOICE_SIZE)
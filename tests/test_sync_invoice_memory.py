@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#    Copyright (C) Sitaram Solutions (<https://sitaramsolutions.in/>).
+#
+#    For Module Support : info@sitaramsolutions.in  or Skype : contact.hiren1188
+#
+##############################################################################
+
+import logging
+import tracemalloc
+
+from odoo.tests import tagged
+
+from odoo.addons.sr_manual_currency_exchange_rate.models.inherited_invoice import (
+    SYNC_INVOICE_FIELDS,
+    SyncInvoiceSnapshot,
+)
+from .common import ManualRateBenchmarkCommon
+
+_logger = logging.getLogger(__name__)
+
+INVOICE_SIZE = 1000
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestSyncInvoiceMemory(ManualRateBenchmarkCommon):
+
+    def _traced_size(self, build):
+        """ Return the object built by ``build`` and the memory it keeps allocated. """
+        tracemalloc.start()
+        try:
+            start = tracemalloc.take_snapshot()
+            result = build()
+            size = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, 'filename'))
+        finally:
+            tracemalloc.stop()
+        return result, size
+
+    def test_snapshot_memory(self):
+        """ The column snapshot of the invoice lines is smaller than one dict of values per line. """
+        invoice = self._create_manual_rate_invoice(INVOICE_SIZE)
+        lines = invoice.invoice_line_ids
+        # Read the values first so that only the snapshots are measured, not the record cache.
+        lines.mapped(lambda line: [line[fname] for fname in SYNC_INVOICE_FIELDS])
+
+        snapshot, snapshot_size = self._traced_size(lambda: SyncInvoiceSnapshot(lines))
+        dicts, dicts_size = self._traced_size(lambda: {
+            line.id: {fname: line[fname] for fname in SYNC_INVOICE_FIELDS} for line in lines
+        })
+        _logger.info(
+            "Sync snapshot of %s lines: %s bytes in columns, %s bytes in dicts",
+            len(lines), snapshot_size, dicts_size,
+        )
+        for line in lines:
+            self.assertEqual(snapshot.get(line.id), tuple(dicts[line.id].values()))
+        self.assertLess(snapshot_size, dicts_size)
+
+    def test_large_invoice_creation_peak(self):
+        """ Log the memory peak of the creation of a large invoice. """
+        tracemalloc.start()
+        try:
+            invoice = self._create_manual_rate_invoice(INVOICE_SIZE)
+            self.env.flush_all()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        _logger.info(
+            "Creation of an invoice of %s lines: memory peak of %.1f MiB (%.1f MiB kept)",
+            INVOICE_SIZE, peak / 1024 / 1024, current / 1024 / 1024,
+        )
+        self.assertEqual(len(invoice.invoice_line_ids), INVOICE_SIZE)
@@ -9,7 +9,6 @@
 ##############################################################################
 
 from odoo import models, fields, api, _
-from odoo.exceptions import ValidationError
 
 
 class srAccountPaymentRegister(models.TransientModel):
@@ -27,6 +26,12 @@ class srAccountPaymentRegister(models.TransientModel):
         help="Muestra el saldo actual de la cuenta de liquidez asociada a este diario."
     )
     
+    journal_available_balance = fields.Monetary(
+        string="Saldo Disponible del Diario",
+        compute='_compute_journal_available_balance',
+        help="Saldo actual del diario menos los montos reservados por los pagos de salida en borrador."
+    )
+    
     can_confirm_payment = fields.Boolean(
         string="Can Confirm Payment",
         compute='_compute_can_confirm_payment',
@@ -71,15 +76,13 @@ class srAccountPaymentRegister(models.TransientModel):
             # Foreign currency on source line but the company currency one on the opposite line.
             if self.apply_manual_currency_exchange and self.manual_currency_exchange_rate:
                 # return self.source_currency_custom_rate(self.source_amount_currency)
-                return self.source_currency_id.with_context(
-                    cus_manual_rate=self.manual_currency_exchange_rate,
-                    cus_active_manutal_currency=self.apply_manual_currency_exchange,
-                )._convert(
-                    self.source_amount_currency,
-                    comp_curr,
-                    self.company_id,
-                    self.payment_date,
-                ), False
+                with self.env['res.currency']._rate_override(self.manual_currency_exchange_rate, kind='convert'):
+                    return self.source_currency_id._convert(
+                        self.source_amount_currency,
+                        comp_curr,
+                        self.company_id,
+                        self.payment_date,
+                    ), False
             else:
                 return self.source_currency_id._convert(
                     self.source_amount_currency,
@@ -89,29 +92,19 @@ class srAccountPaymentRegister(models.TransientModel):
                 ), False
         elif self.source_currency_id == comp_curr and self.currency_id != comp_curr:
             # Company currency on source line but a foreign currency one on the opposite line.
-            residual_amount = 0.0
-            for aml in batch_result['lines']:
-                if not aml.move_id.payment_id and not aml.move_id.statement_line_id:
-                    conversion_date = self.payment_date
-                else:
-                    conversion_date = aml.date
-                if self.apply_manual_currency_exchange and self.manual_currency_exchange_rate:
-                    residual_amount += comp_curr.with_context(
-                    diff_manual_rate=self.manual_currency_exchange_rate,
-                    diff_active_manutal_currency=self.apply_manual_currency_exchange,
-                )._convert(
-                    aml.amount_residual,
+            lines = batch_result['lines']
+            conversion_dates = [
+                self.payment_date if not aml.move_id.payment_id and not aml.move_id.statement_line_id else aml.date
+                for aml in lines
+            ]
+            manual_rate = self.apply_manual_currency_exchange and self.manual_currency_exchange_rate
+            with self.env['res.currency']._rate_override(manual_rate, kind='convert'):
+                residual_amount = sum(comp_curr._convert_many(
+                    lines.mapped('amount_residual'),
                     self.currency_id,
                     self.company_id,
-                    conversion_date,
-                )
-                else:
-                    residual_amount += comp_curr._convert(
-                        aml.amount_residual,
-                        self.currency_id,
-                        self.company_id,
-                        conversion_date,
-                    )
+                    conversion_dates,
+                ))
             return abs(residual_amount), False
         else:
             # Foreign currency on payment different than the one set on the journal entries.
@@ -132,98 +125,29 @@ class srAccountPaymentRegister(models.TransientModel):
         Calcula el saldo del diario al momento de la fecha del pago,
         obteniendo el saldo directamente desde la cuenta contable asociada.
         """
-        # Get all unique accounts and dates to optimize the query
-        accounts_to_compute = {}
+        balances = self.env['sr.journal.balance.service']._get_balances(
+            (wizard.journal_id, wizard.payment_date) for wizard in self
+        )
         for payment in self:
-            if (payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and 
-                payment.journal_id.default_account_id and 
-                payment.payment_date):
-                account = payment.journal_id.default_account_id
-                if account.id not in accounts_to_compute:
-                    accounts_to_compute[account.id] = []
-                accounts_to_compute[account.id].append(payment.payment_date)
-        
-        # Calculate balances for each account up to each date
-        balances = {}
-        for account_id, dates in accounts_to_compute.items():
-            for date in set(dates):  # Use set to avoid duplicate queries for same date
-                domain = [
-                    ('account_id', '=', account_id),
-                    ('date', '<=', date),
-                    ('parent_state', '=', 'posted')
-                ]
-                
-                # Use _read_group for efficient aggregation like Odoo core
-                result = self.env['account.move.line']._read_group(
-                    domain=domain,
-                    groupby=['account_id'],
-                    aggregates=['balance:sum'],
-                )
-                
-                if result:
-                    # _read_group returns a list of tuples, where the first element is the group key
-                    # and subsequent elements are the aggregated values
-                    balance = result[0][1]  # First result, second element (balance sum)
-                    balances[(account_id, date)] = balance
-                else:
-                    balances[(account_id, date)] = 0.0
-        
-        # Assign balances to payments
+            payment.journal_current_balance = balances.get((payment.journal_id.id, payment.payment_date), 0.0)
+
+    @api.depends('journal_id', 'journal_current_balance')
+    def _compute_journal_available_balance(self):
+        reserved_amounts = self.env['sr.journal.balance.service']._get_reserved_amounts(self.journal_id)
         for payment in self:
-            payment.journal_current_balance = 0.0
-            
-            if (payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and 
-                payment.journal_id.default_account_id and 
-                payment.payment_date):
-                
-                account = payment.journal_id.default_account_id
-                balance = balances.get((account.id, payment.payment_date), 0.0)
-                
-                # For foreign currency journals, we need to convert the balance
-                if (payment.journal_id.currency_id and 
-                    payment.journal_id.currency_id != payment.company_id.currency_id):
-                    # The balance field is in company currency, so we need to get the amount_currency
-                    domain = [
-                        ('account_id', '=', account.id),
-                        ('date', '<=', payment.payment_date),
-                        ('parent_state', '=', 'posted')
-                    ]
-                    
-                    # Use _read_group for amount_currency aggregation
-                    result = self.env['account.move.line']._read_group(
-                        domain=domain,
-                        groupby=['account_id'],
-                        aggregates=['amount_currency:sum'],
-                    )
-                    
-                    if result:
-                        # _read_group returns a list of tuples, where the first element is the group key
-                        # and subsequent elements are the aggregated values
-                        payment.journal_current_balance = result[0][1]  # First result, second element (amount_currency sum)
-                    else:
-                        payment.journal_current_balance = 0.0
-                else:
-                    payment.journal_current_balance = balance
+            payment.journal_available_balance = (
+                payment.journal_current_balance - reserved_amounts.get(payment.journal_id._origin.id, 0.0))
 
-    @api.depends('journal_id', 'amount', 'journal_current_balance')
+    @api.depends('journal_id', 'amount', 'journal_current_balance', 'journal_available_balance')
     def _compute_can_confirm_payment(self):
         """
-        Determina si el pago puede ser confirmado basándose en el saldo del diario
+        Determina si el pago puede ser confirmado basándose en el saldo disponible del diario
         """
+        service = self.env['sr.journal.balance.service']
         for payment in self:
-            payment.can_confirm_payment = True
-            
-            # Solo validamos para pagos de salida (outbound) y diarios de banco/efectivo
-            if (payment.payment_type == 'outbound' and 
-                payment.journal_id and 
-                payment.journal_id.type in ('bank', 'cash') and
-                payment.amount and payment.journal_current_balance):
-                
-                # Si el monto del pago es mayor que el saldo disponible, no se puede confirmar
-                if payment.amount > payment.journal_current_balance:
-                    payment.can_confirm_payment = False
+            payment.can_confirm_payment = not service._exceeds_balance(
+                payment.payment_type, payment.journal_id, payment.amount,
+                payment.journal_current_balance, payment.journal_available_balance)
 
     @api.depends('can_confirm_payment')
     def _compute_payment_button_state(self):
@@ -268,19 +192,9 @@ class srAccountPaymentRegister(models.TransientModel):
         Valida que el diario tenga saldo suficiente para realizar el pago
         """
         self.ensure_one()
-        
-        # Solo validamos para pagos de salida (outbound) y diarios de banco/efectivo
-        if (self.payment_type == 'outbound' and 
-            self.journal_id and 
-            self.journal_id.type in ('bank', 'cash') and
-            self.amount and self.journal_current_balance):
-            
-            # Si el monto del pago es mayor que el saldo disponible, lanzamos error
-            if self.amount > self.journal_current_balance:
-                raise ValidationError(_(
-                    "No se puede confirmar el pago. El monto del pago (%.2f) "
-                    "excede el saldo disponible en el diario (%.2f)."
-                ) % (self.amount, self.journal_current_balance))
+        self.env['sr.journal.balance.service']._validate_balance(
+            self.payment_type, self.journal_id, self.amount,
+            self.journal_current_balance, self.journal_available_balance)
 
     def _create_payment_vals_from_wizard(self, batch_result):
         # Validate journal balance before creating payment